@@ -0,0 +1,37 @@
+"""
+MODEL ARCHITECTURES
+ResNet18 networks used by the X-ray and ECG predictors (MUST MATCH TRAINING)
+"""
+
+import torch.nn as nn
+from torchvision import models
+
+XRAY_NUM_CLASSES = 2
+ECG_NUM_CLASSES = 5
+
+
+def build_xray_model():
+    """ResNet18 with the pneumonia classification head from train_fast_model.py"""
+    model = models.resnet18(pretrained=False)
+    num_features = model.fc.in_features
+    model.fc = nn.Sequential(
+        nn.Dropout(0.5),
+        nn.Linear(num_features, 256),
+        nn.ReLU(),
+        nn.Dropout(0.3),
+        nn.Linear(256, XRAY_NUM_CLASSES)
+    )
+    return model
+
+
+def build_ecg_model(num_classes=ECG_NUM_CLASSES):
+    """ResNet18 with the ECG beat classification head from train_ecg_vision.py"""
+    model = models.resnet18(pretrained=False)
+    num_features = model.fc.in_features
+    model.fc = nn.Sequential(
+        nn.Dropout(0.5),
+        nn.Linear(num_features, 128),
+        nn.ReLU(),
+        nn.Linear(128, num_classes)
+    )
+    return model
@@ -0,0 +1,258 @@
+"""
+SYMPTOM RISK BACKFILL
+Scores every `symptoms` journal entry that was saved without a risk
+(symptomRisk == null) and writes symptomRisk / riskScore / matchedSymptoms /
+aiSuggestion back to Firestore
+
+Pages through the unscored entries ordered by document id, scores each page
+with symptom_risk.score_batch and writes it back in batched commits of at
+most FIRESTORE_BATCH_LIMIT writes, with at most --concurrency pages
+committing at once. After every page whose commits (and all earlier ones)
+succeeded, the last document id is saved to the checkpoint file, so an
+interrupted run continues where it stopped; rewriting an entry is harmless
+since scoring is deterministic. The checkpoint is deleted once a scan
+reaches the end: document ids are random, so entries added later can sort
+before the old cursor, and the next run has to start from the beginning
+(cheap, since scored entries no longer match the query).
+
+Usage (from backend/, with serviceAccountKey.json in place):
+    python backfill_symptom_risk.py [--page-size 500] [--concurrency 4] [--dry-run]
+
+Against the local emulator (firebase emulators:start --only firestore):
+    FIRESTORE_EMULATOR_HOST=localhost:8080 GOOGLE_CLOUD_PROJECT=demo-mediexpert \\
+        python backfill_symptom_risk.py --seed 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+import firebase_utils
+from symptom_risk import score_batch
+
+COLLECTION = "symptoms"
+
+# Firestore rejects batched writes with more operations than this
+FIRESTORE_BATCH_LIMIT = 500
+
+# Stored with every result so later scorer changes can be re-run selectively
+SCORER_VERSION = "keyword-v1"
+
+DEFAULT_CHECKPOINT = "symptom_backfill_checkpoint.json"
+
+# ============================================================
+# CHECKPOINTS
+# ============================================================
+
+def load_checkpoint(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"last_document_id": None, "scanned": 0, "updated": 0}
+
+
+def clear_checkpoint(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def save_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file"""
+    checkpoint["saved_at"] = time.time()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+# ============================================================
+# SCORING
+# ============================================================
+
+def to_fields(result):
+    """Firestore fields for one symptom_risk result"""
+    return {
+        "symptomRisk": result["risk_category"],
+        "riskScore": result["risk_score"],
+        "matchedSymptoms": sorted(result["matched_symptoms"]),
+        "aiSuggestion": "; ".join(result["additional_concerns"]),
+        "symptomScorer": SCORER_VERSION,
+        "symptomScoredAt": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def unscored_page(collection, page_size, after_id):
+    """Next page of unscored entries (only their details field), by document id"""
+    query = (
+        collection
+        .where(filter=FieldFilter("symptomRisk", "==", None))
+        .order_by(FieldPath.document_id())
+        .select(["details"])
+        .limit(page_size)
+    )
+    if after_id:
+        query = query.start_after({FieldPath.document_id(): collection.document(after_id)})
+    return list(query.stream())
+
+
+def commit_page(db, snapshots, results):
+    """Write one page back in batches of at most FIRESTORE_BATCH_LIMIT updates"""
+    for start in range(0, len(snapshots), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for snapshot, result in zip(snapshots[start:start + FIRESTORE_BATCH_LIMIT], results[start:start + FIRESTORE_BATCH_LIMIT]):
+            batch.update(snapshot.reference, to_fields(result))
+        batch.commit()
+    return len(snapshots)
+
+
+def backfill(db, checkpoint_path=DEFAULT_CHECKPOINT, page_size=FIRESTORE_BATCH_LIMIT, concurrency=4, limit=None, dry_run=False):
+    """
+    Score and write back all unscored symptom entries
+
+    Returns:
+        The final checkpoint dict (scanned / updated counts, last document id,
+        complete=True when the scan reached the end)
+    """
+    collection = db.collection(COLLECTION)
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint["last_document_id"]:
+        print(f"Resuming after document {checkpoint['last_document_id']} ({checkpoint['updated']} updated so far)")
+
+    started = time.perf_counter()
+    after_id = checkpoint["last_document_id"]
+    scanned = 0
+    complete = False
+    # (last document id, future) per page, oldest first
+    in_flight = deque()
+    errors = []
+
+    def finish_oldest():
+        last_id, future = in_flight.popleft()
+        try:
+            written = future.result()
+        except Exception as e:
+            errors.append(e)
+        # Never move the checkpoint past a page that was not written
+        if errors:
+            return
+        checkpoint["updated"] += written
+        checkpoint["last_document_id"] = last_id
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="backfill") as pool:
+        try:
+            while (limit is None or scanned < limit) and not errors:
+                size = page_size if limit is None else min(page_size, limit - scanned)
+                snapshots = unscored_page(collection, size, after_id)
+                if not snapshots:
+                    complete = True
+                    break
+
+                results = score_batch([(snapshot.to_dict() or {}).get("details") for snapshot in snapshots])
+                scanned += len(snapshots)
+                checkpoint["scanned"] += len(snapshots)
+                after_id = snapshots[-1].id
+
+                if not dry_run:
+                    in_flight.append((after_id, pool.submit(commit_page, db, snapshots, results)))
+                    # Checkpoints only advance over pages whose commits finished
+                    while len(in_flight) > max(1, concurrency):
+                        finish_oldest()
+
+                elapsed = time.perf_counter() - started
+                print(f"  {scanned} scanned, {checkpoint['updated']} written ({scanned / elapsed:.0f} entries/s)")
+        finally:
+            # Record everything that did get written before stopping
+            while in_flight:
+                finish_oldest()
+
+    if errors:
+        print(f"⚠ Backfill stopped after a failed commit; rerun to resume after document {checkpoint['last_document_id']}")
+        raise errors[0]
+
+    # Only an interrupted run (--limit, an error, Ctrl-C) resumes from the cursor
+    checkpoint["complete"] = complete
+    if complete and not dry_run:
+        clear_checkpoint(checkpoint_path)
+
+    elapsed = time.perf_counter() - started
+    print(f"✓ Backfill {'(dry run) ' if dry_run else ''}finished: {scanned} entries scored in {elapsed:.1f}s")
+    return checkpoint
+
+# ============================================================
+# EMULATOR SEEDING
+# ============================================================
+
+SAMPLE_SYMPTOMS = [
+    "Severe chest pain since this morning and shortness of breath",
+    "Mild cough with some phlegm, feeling tired",
+    "Fever and chills at night, sweating a lot",
+    "Coughing blood, feeling confused",
+    "Slight headache, otherwise fine",
+    "Unbearable pain in my back, very weak",
+]
+
+
+def seed(db, count):
+    """Add `count` unscored entries, shaped like the frontend's saveSymptomEntry"""
+    collection = db.collection(COLLECTION)
+    rng = random.Random(0)
+    for start in range(0, count, FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for index in range(start, min(count, start + FIRESTORE_BATCH_LIMIT)):
+            batch.set(collection.document(), {
+                "patientId": f"seed-patient-{index % 50}",
+                "patientName": "Seed Patient",
+                "patientEmail": "",
+                "patientMobile": "",
+                "details": rng.choice(SAMPLE_SYMPTOMS),
+                "symptomRisk": None,
+                "aiSuggestion": None,
+                "status": "SAVED",
+                "recordedAt": firestore.SERVER_TIMESTAMP,
+                "reviewedAt": None,
+                "doctorNote": None,
+                "doctorId": None,
+                "doctorName": None,
+                "agreeWithAI": None,
+            })
+        batch.commit()
+    print(f"✓ Seeded {count} unscored symptom entries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill symptomRisk / aiSuggestion on the symptoms collection")
+    parser.add_argument("--page-size", type=int, default=FIRESTORE_BATCH_LIMIT, help="Entries read and scored per page")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pages committing at the same time")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Resume file")
+    parser.add_argument("--reset", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many entries")
+    parser.add_argument("--dry-run", action="store_true", help="Score without writing anything")
+    parser.add_argument("--seed", type=int, default=0, help="Emulator only: first add this many unscored entries")
+    args = parser.parse_args()
+
+    firebase_utils.initialize_firebase()
+    db = firebase_utils.get_db()
+    if db is None:
+        raise SystemExit("Firestore is not configured (serviceAccountKey.json or FIRESTORE_EMULATOR_HOST)")
+
+    if args.seed:
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            raise SystemExit("--seed only runs against the emulator (set FIRESTORE_EMULATOR_HOST)")
+        seed(db, args.seed)
+
+    if args.reset:
+        clear_checkpoint(args.checkpoint)
+
+    result = backfill(db, args.checkpoint, max(1, args.page_size), args.concurrency, args.limit, args.dry_run)
+    print(f"  {result['updated']} entries updated in total, last document {result['last_document_id']}")
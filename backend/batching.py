@@ -0,0 +1,121 @@
+"""
+MICRO-BATCHING SCHEDULER
+Collects concurrent inference requests and runs them as one batched pass
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from metrics import BATCH_QUEUE_WAIT_SECONDS, BATCH_SIZE
+
+
+class MicroBatcher:
+    """
+    Queues single-sample requests and hands them to `run_batch` in groups
+
+    A batch is closed as soon as it holds `max_batch_size` items or
+    `max_wait_ms` has passed since its first item arrived, whichever comes
+    first. `run_batch` receives the list of submitted items and must return
+    one result per item, in the same order. With `num_workers` > 1 several
+    batches run at once, so `run_batch` must be thread-safe. `prepare`, if
+    given, is called on the worker thread before every batch (e.g. to apply
+    per-thread torch settings).
+    """
+
+    def __init__(self, name, run_batch, max_batch_size=8, max_wait_ms=5.0, num_workers=1, prepare=None):
+        self.name = name
+        self.run_batch = run_batch
+        self.prepare = prepare
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.num_workers = max(1, int(num_workers))
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = None
+
+        # Statistics
+        self._batch_sizes = Counter()
+        self._queue_wait_total = 0.0
+
+    def submit(self, item):
+        """Queue one item and return a Future resolved with its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _ensure_started(self):
+        if self._threads is not None:
+            return
+        with self._lock:
+            if self._threads is None:
+                threads = [
+                    threading.Thread(target=self._loop, name=f"batcher-{self.name}-{i}", daemon=True)
+                    for i in range(self.num_workers)
+                ]
+                for thread in threads:
+                    thread.start()
+                self._threads = threads
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._run(batch)
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        items = [entry[0] for entry in batch]
+
+        try:
+            if self.prepare is not None:
+                self.prepare()
+            results = self.run_batch(items)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            waits = [started - queued for _, _, queued in batch]
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._queue_wait_total += sum(waits)
+            BATCH_SIZE.labels(self.name).observe(len(batch))
+            queue_wait = BATCH_QUEUE_WAIT_SECONDS.labels(self.name)
+            for wait in waits:
+                queue_wait.observe(wait)
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        """Achieved batch sizes and queueing delay since startup"""
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            requests = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "num_workers": self.num_workers,
+                "batches": batches,
+                "requests": requests,
+                "mean_batch_size": round(requests / batches, 2) if batches else 0.0,
+                "mean_queue_wait_ms": round(self._queue_wait_total / requests * 1000.0, 3) if requests else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            }
@@ -0,0 +1,144 @@
+"""
+CPU INFERENCE MODE BENCHMARK
+Label-only and GradCAM latency of the trained X-ray and ECG checkpoints in
+fp32, channels-last, bf16 autocast and channels-last + bf16, with their
+agreement against fp32 (probabilities, top-1 labels and GradCAM maps)
+
+bf16 modes are skipped on CPUs without bfloat16 support.
+
+Usage (from backend/, with the model weights in place):
+    python benchmark_cpu_modes.py [--json cpu_modes_report.json]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+import predict
+import predict_ecg
+from architectures import build_ecg_model, build_xray_model
+from cpu_modes import bf16_supported, mode_name, wrap
+from gradcam import GradCAM
+from model_registry import load_checkpoint
+
+MODELS = {
+    "xray": (build_xray_model, predict.MODEL_PATH, predict.MODEL_VERSION),
+    "ecg": (lambda: build_ecg_model(predict_ecg.NUM_CLASSES), predict_ecg.MODEL_PATH, predict_ecg.MODEL_VERSION),
+}
+MODES = [(False, False), (True, False), (False, True), (True, True)]
+
+LABEL_BATCH_SIZES = [1, 8]
+GRADCAM_BATCH_SIZE = 8
+AGREEMENT_SAMPLES = 32
+REPEATS = 10
+
+
+def time_ms(fn):
+    """Median milliseconds of `fn()` after two warmup calls"""
+    fn()
+    fn()
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def explain(model, gradcam, batch):
+    """Forward + GradCAM the way run_batch does it"""
+    with gradcam.capture() as captured:
+        output = model(batch)
+    probabilities = torch.softmax(output, dim=1).detach()
+    return probabilities, gradcam.compute(captured, output, probabilities.argmax(dim=1))
+
+
+def run_mode(build_model, checkpoint_path, base_version, channels_last, bf16, inputs):
+    # Fresh copy per mode: channels-last converts the weights in place
+    inner, _ = load_checkpoint(build_model, checkpoint_path, base_version)
+    gradcam = GradCAM(inner.layer4[1].conv2)
+    model = wrap(inner, channels_last, bf16)
+
+    result = {"mode": mode_name(channels_last, bf16)}
+    for batch_size in LABEL_BATCH_SIZES:
+        batch = inputs[:batch_size]
+
+        def label_only():
+            with torch.inference_mode():
+                model(batch)
+        result[f"label_b{batch_size}_ms"] = round(time_ms(label_only), 2)
+
+    gradcam_batch = inputs[:GRADCAM_BATCH_SIZE]
+    result[f"gradcam_b{GRADCAM_BATCH_SIZE}_ms"] = round(time_ms(lambda: explain(model, gradcam, gradcam_batch)), 2)
+
+    probabilities, cams = [], []
+    for start in range(0, len(inputs), GRADCAM_BATCH_SIZE):
+        p, c = explain(model, gradcam, inputs[start:start + GRADCAM_BATCH_SIZE])
+        probabilities.append(p)
+        cams.append(c)
+    gradcam.remove()
+    return result, torch.cat(probabilities), np.concatenate(cams)
+
+
+def benchmark(name):
+    build_model, checkpoint_path, base_version = MODELS[name]
+    generator = torch.Generator().manual_seed(0)
+    inputs = torch.randn(AGREEMENT_SAMPLES, 3, 224, 224, generator=generator)
+
+    rows, reference = [], None
+    for channels_last, bf16 in MODES:
+        if bf16 and not bf16_supported():
+            print(f"  {mode_name(channels_last, bf16)}: skipped (no bf16 support on this CPU)")
+            continue
+        result, probabilities, cams = run_mode(build_model, checkpoint_path, base_version, channels_last, bf16, inputs)
+        if reference is None:
+            reference = (result, probabilities, cams)
+
+        base, base_probabilities, base_cams = reference
+        result["max_probability_diff"] = round((probabilities - base_probabilities).abs().max().item(), 6)
+        result["top1_agreement"] = round((probabilities.argmax(1) == base_probabilities.argmax(1)).float().mean().item() * 100, 2)
+        result["max_cam_diff"] = round(float(np.abs(cams - base_cams).max()), 4)
+        result["cam_correlation"] = round(float(np.corrcoef(cams.ravel(), base_cams.ravel())[0, 1]), 4)
+        for key in (f"label_b{LABEL_BATCH_SIZES[-1]}_ms", f"gradcam_b{GRADCAM_BATCH_SIZE}_ms"):
+            result[key.replace("_ms", "_speedup")] = round(base[key] / result[key], 2)
+        rows.append(result)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fp32 vs channels-last vs bf16 autocast on CPU")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = {"torch_threads": torch.get_num_threads(), "bf16_supported": bf16_supported(), "models": {}}
+    print("\n" + "="*104)
+    print(f"CPU INFERENCE MODES ({torch.get_num_threads()} threads, bf16 supported: {bf16_supported()})")
+    print("="*104)
+
+    for name, (_, checkpoint_path, _) in MODELS.items():
+        if not os.path.exists(checkpoint_path):
+            print(f"\n{name}: {checkpoint_path} not found, skipped")
+            continue
+        print(f"\n{name} ({checkpoint_path})")
+        rows = benchmark(name)
+        report["models"][name] = rows
+
+        b = LABEL_BATCH_SIZES[-1]
+        print(f"  {'mode':<20} {'label b1':>9} {f'label b{b}':>9} {f'gradcam b{GRADCAM_BATCH_SIZE}':>11} {'speedup':>8} "
+              f"{'max p diff':>11} {'top-1 %':>8} {'cam diff':>9} {'cam corr':>9}")
+        for row in rows:
+            print(f"  {row['mode']:<20} {row['label_b1_ms']:>9.1f} {row[f'label_b{b}_ms']:>9.1f} "
+                  f"{row[f'gradcam_b{GRADCAM_BATCH_SIZE}_ms']:>11.1f} {row[f'label_b{b}_speedup']:>7.2f}x "
+                  f"{row['max_probability_diff']:>11.2e} {row['top1_agreement']:>8.1f} {row['max_cam_diff']:>9.4f} {row['cam_correlation']:>9.4f}")
+
+    print("="*104)
+    print("Times are median ms per batch; speedup is label-only at the largest batch vs fp32.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
@@ -0,0 +1,165 @@
+"""
+GRAYSCALE X-RAY MODEL BENCHMARK
+The RGB X-ray model against its single-channel variant (grayscale_model.py):
+decode + preprocessing time, input tensor size, label-only and GradCAM
+latency, and agreement of the outputs on synthetic grey scans
+
+Usage (from backend/, with the X-ray weights in place):
+    python benchmark_grayscale.py [--json grayscale_report.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+import predict
+from architectures import build_xray_model
+from gradcam import GradCAM
+from grayscale_model import to_grayscale
+from model_registry import load_checkpoint
+from preprocessing import preprocess
+
+SIZES = [(1024, 1024), (2048, 1800)]
+FORMATS = ["JPEG", "PNG"]
+LABEL_BATCH_SIZES = [1, 8]
+GRADCAM_BATCH_SIZE = 8
+AGREEMENT_SAMPLES = 32
+REPEATS = 10
+
+
+def synthetic_xray(width, height, fmt, seed=0):
+    """Smooth grey structure plus noise, saved as a single-channel scan"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    phase = rng.uniform(0, 2 * np.pi)
+    pixels = 128 + 60 * np.sin(x / 150.0 + phase) * np.cos(y / 200.0) + rng.normal(0, 12, (height, width))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "L")
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, quality=90) if fmt == "JPEG" else image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def time_ms(fn):
+    """Median milliseconds of `fn()` after two warmup calls"""
+    fn()
+    fn()
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def explain(model, gradcam, batch):
+    """Forward + GradCAM the way run_batch does it"""
+    with gradcam.capture() as captured:
+        output = model(batch)
+    return output.detach(), gradcam.compute(captured, output, output.argmax(dim=1))
+
+
+def benchmark_preprocessing():
+    rows = []
+    for width, height in SIZES:
+        for fmt in FORMATS:
+            data = synthetic_xray(width, height, fmt)
+            rgb = time_ms(lambda: preprocess(data, validate_xray=True))
+            grey = time_ms(lambda: preprocess(data, validate_xray=True, grayscale=True))
+            rows.append({"image": f"{width}x{height} {fmt}", "rgb_ms": round(rgb, 2), "grayscale_ms": round(grey, 2),
+                         "speedup": round(rgb / grey, 2)})
+    return rows
+
+
+def benchmark_model():
+    rgb_model, _ = load_checkpoint(build_xray_model, predict.MODEL_PATH, predict.MODEL_VERSION)
+    grey_model, _ = load_checkpoint(build_xray_model, predict.MODEL_PATH, predict.MODEL_VERSION)
+    to_grayscale(grey_model)
+
+    scans = [synthetic_xray(1024, 1024, "JPEG", seed) for seed in range(AGREEMENT_SAMPLES)]
+    rgb_inputs = torch.stack([preprocess(scan) for scan in scans])
+    grey_inputs = torch.stack([preprocess(scan, grayscale=True) for scan in scans])
+
+    result = {
+        "input_bytes_per_image": {
+            "rgb": rgb_inputs[0].numel() * rgb_inputs.element_size(),
+            "grayscale": grey_inputs[0].numel() * grey_inputs.element_size(),
+        },
+        "conv1_macs": {
+            "rgb": rgb_model.conv1.weight.numel() * 112 * 112,
+            "grayscale": grey_model.conv1.weight.numel() * 112 * 112,
+        },
+    }
+
+    for name, model, inputs in (("rgb", rgb_model, rgb_inputs), ("grayscale", grey_model, grey_inputs)):
+        for batch_size in LABEL_BATCH_SIZES:
+            batch = inputs[:batch_size]
+
+            def label_only():
+                with torch.inference_mode():
+                    model(batch)
+            result[f"{name}_label_b{batch_size}_ms"] = round(time_ms(label_only), 2)
+
+        gradcam = GradCAM(model.layer4[1].conv2)
+        batch = inputs[:GRADCAM_BATCH_SIZE]
+        result[f"{name}_gradcam_b{GRADCAM_BATCH_SIZE}_ms"] = round(time_ms(lambda: explain(model, gradcam, batch)), 2)
+
+        outputs, cams = [], []
+        for start in range(0, len(inputs), GRADCAM_BATCH_SIZE):
+            output, cam = explain(model, gradcam, inputs[start:start + GRADCAM_BATCH_SIZE])
+            outputs.append(output)
+            cams.append(cam)
+        gradcam.remove()
+        result[f"{name}_outputs"] = (torch.cat(outputs), np.concatenate(cams))
+
+    rgb_logits, rgb_cams = result.pop("rgb_outputs")
+    grey_logits, grey_cams = result.pop("grayscale_outputs")
+    result["max_logit_diff"] = float(f"{(grey_logits - rgb_logits).abs().max().item():.3e}")
+    result["max_probability_diff"] = float(f"{(torch.softmax(grey_logits, 1) - torch.softmax(rgb_logits, 1)).abs().max().item():.3e}")
+    result["top1_agreement"] = round((grey_logits.argmax(1) == rgb_logits.argmax(1)).float().mean().item() * 100, 2)
+    result["max_cam_diff"] = float(f"{np.abs(grey_cams - rgb_cams).max():.3e}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RGB vs single-channel grayscale X-ray model")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = {"torch_threads": torch.get_num_threads()}
+    print("\n" + "="*72)
+    print(f"GRAYSCALE X-RAY MODEL ({torch.get_num_threads()} threads)")
+    print("="*72)
+
+    print("\nDecode + validate + normalise (ms per upload)")
+    report["preprocessing"] = benchmark_preprocessing()
+    for row in report["preprocessing"]:
+        print(f"  {row['image']:<16} RGB {row['rgb_ms']:>7.2f}   grey {row['grayscale_ms']:>7.2f}   {row['speedup']:.2f}x")
+
+    if not os.path.exists(predict.MODEL_PATH):
+        print(f"\n{predict.MODEL_PATH} not found, model comparison skipped")
+    else:
+        model = benchmark_model()
+        report["model"] = model
+        b = LABEL_BATCH_SIZES[-1]
+        g = GRADCAM_BATCH_SIZE
+        print(f"\nModel ({predict.MODEL_PATH}, median ms per batch)")
+        print(f"  input per image   RGB {model['input_bytes_per_image']['rgb']:>8,} B   grey {model['input_bytes_per_image']['grayscale']:>8,} B")
+        print(f"  conv1 MACs        RGB {model['conv1_macs']['rgb']:>10,}   grey {model['conv1_macs']['grayscale']:>10,}")
+        print(f"  label b1          RGB {model['rgb_label_b1_ms']:>7.1f}   grey {model['grayscale_label_b1_ms']:>7.1f}")
+        print(f"  label b{b}          RGB {model[f'rgb_label_b{b}_ms']:>7.1f}   grey {model[f'grayscale_label_b{b}_ms']:>7.1f}")
+        print(f"  gradcam b{g}        RGB {model[f'rgb_gradcam_b{g}_ms']:>7.1f}   grey {model[f'grayscale_gradcam_b{g}_ms']:>7.1f}")
+        print(f"  agreement         max logit diff {model['max_logit_diff']:.1e}, max p diff {model['max_probability_diff']:.1e}, "
+              f"top-1 {model['top1_agreement']:.1f}%, max cam diff {model['max_cam_diff']:.1e}")
+
+    print("="*72)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
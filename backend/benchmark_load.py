@@ -0,0 +1,245 @@
+"""
+HTTP LOAD BENCHMARK
+Drives /predict, /predict_ecg and /upload-image with synthetic X-ray and ECG
+images at a configurable concurrency and reports throughput, p50/p95/p99
+latency and memory, as a table and as JSON for comparing runs across commits
+
+Uploads go to the local Cloudinary stand-in (UPLOAD_BACKEND=local) with
+--upload-delay-ms of injected latency, so no network or credentials are
+needed. By default the app runs in-process through httpx's ASGI transport;
+pass --url to load-test a running server instead (start it with
+UPLOAD_BACKEND=local to keep Cloudinary out of the numbers).
+
+Usage (from backend/, with the model weights in place):
+    python benchmark_load.py --scenario xray --concurrency 8 --requests 200
+    python benchmark_load.py --scenario all --json load_report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+SCENARIOS = {
+    "xray": {"path": "/predict", "image": "xray"},
+    "ecg": {"path": "/predict_ecg", "image": "ecg"},
+    "upload": {"path": "/upload-image", "image": "xray"},
+}
+
+# ============================================================
+# SYNTHETIC IMAGES
+# ============================================================
+
+def synthetic_xray(seed, size=1024):
+    """Grayscale chest-film look: dark lung fields, rib bands, noise (JPEG bytes)"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size
+    image = 170 - 40 * np.abs(x - 0.5)
+
+    for cx in (0.32, 0.68):
+        lung = ((x - cx) / 0.17) ** 2 + ((y - 0.5) / 0.33) ** 2 < 1
+        image = np.where(lung, image - 70, image)
+    image += 12 * np.sin(y * rng.uniform(35, 45) + rng.uniform(0, np.pi))
+    image += rng.normal(0, 8, (size, size))
+
+    ok, buffer = cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def synthetic_ecg(seed, size=200):
+    """Single heartbeat trace, black on white like prepare_ecg_images.py (PNG bytes)"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, 187)
+    signal = (
+        0.15 * np.exp(-((t - 0.2) / 0.03) ** 2)                           # P wave
+        + rng.uniform(0.6, 1.0) * np.exp(-((t - 0.35) / 0.012) ** 2)      # QRS
+        - 0.15 * np.exp(-((t - 0.39) / 0.01) ** 2)
+        + 0.3 * np.exp(-((t - 0.6) / 0.05) ** 2)                          # T wave
+        + rng.normal(0, 0.01, t.size)
+    )
+    points = np.stack([t * (size - 1), (1 - (signal + 0.3) / 1.5) * (size - 1)], axis=1).astype(np.int32)
+
+    image = np.full((size, size), 255, np.uint8)
+    cv2.polylines(image, [points], False, 0, 2)
+    ok, buffer = cv2.imencode(".png", image)
+    return buffer.tobytes()
+
+# ============================================================
+# MEASUREMENT
+# ============================================================
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(np.ceil(q / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def rss_mb(pid="self"):
+    """Current resident set size in MB (Linux /proc), or None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+async def run_scenario(client, name, args, images):
+    scenario = SCENARIOS[name]
+    params = {} if args.explain else {"explain": "false"}
+    data = {"uid": "loadtest"} if name == "upload" else None
+    content_type = "image/png" if scenario["image"] == "ecg" else "image/jpeg"
+    extension = "png" if scenario["image"] == "ecg" else "jpg"
+
+    latencies, statuses = [], {}
+    next_request = iter(range(args.requests))
+
+    async def worker():
+        for i in next_request:
+            files = {"file": (f"{name}_{i}.{extension}", images[i % len(images)], content_type)}
+            start = time.perf_counter()
+            try:
+                response = await client.post(scenario["path"], params=params, files=files, data=data)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    rss_before = rss_mb(args.server_pid or "self")
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ok = statuses.get("200", 0)
+    return {
+        "endpoint": scenario["path"],
+        "requests": args.requests,
+        "succeeded": ok,
+        "errors": args.requests - ok,
+        "status_counts": statuses,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(float(np.mean(latencies)), 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2),
+        },
+        "memory_mb": {
+            "rss_before": rss_before,
+            "rss_after": rss_mb(args.server_pid or "self"),
+            "peak_rss": None if args.url else round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+async def main(args):
+    import httpx
+
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        # In-process app: local upload stand-in and a throwaway prediction cache
+        os.environ.setdefault("UPLOAD_BACKEND", "local")
+        os.environ["LOCAL_UPLOAD_DELAY_MS"] = str(args.upload_delay_ms)
+        os.environ.setdefault("PREDICTION_CACHE_DIR", tempfile.mkdtemp(prefix="load_cache_"))
+
+        import main as app_module
+        from model_registry import registry
+
+        for model_name in registry.names():
+            registry.load(model_name)
+        transport, base_url = httpx.ASGITransport(app=app_module.app), "http://loadtest"
+
+    print("Generating synthetic images...")
+    pools = {
+        "xray": [synthetic_xray(seed, args.image_size) for seed in range(args.unique_images)],
+        "ecg": [synthetic_ecg(seed) for seed in range(args.unique_images)],
+    }
+
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "target": args.url or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "explain": args.explain,
+            "upload_delay_ms": args.upload_delay_ms,
+            "unique_images": args.unique_images,
+            "image_size": args.image_size,
+        },
+        "scenarios": {},
+    }
+
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=timeout) as client:
+        for name in names:
+            images = pools[SCENARIOS[name]["image"]]
+            if args.warmup:
+                warmup_args = argparse.Namespace(**{**vars(args), "requests": args.warmup})
+                await run_scenario(client, name, warmup_args, images[::-1])
+            report["scenarios"][name] = await run_scenario(client, name, args, images)
+
+    print("\n" + "="*84)
+    print(f"LOAD TEST ({report['config']['target']}, concurrency {args.concurrency}, upload delay {args.upload_delay_ms} ms)")
+    print("="*84)
+    print(f"{'scenario':<9} {'ok/total':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'RSS MB':>9}")
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<9} {result['succeeded']:>4}/{result['requests']:<4} {result['throughput_rps']:>8.2f} "
+            f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} {latency['max']:>9.1f} "
+            f"{str(result['memory_mb']['rss_after']):>9}"
+        )
+        if result["errors"]:
+            print(f"          status counts: {result['status_counts']}")
+    print("="*84)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and tail latency of the prediction endpoints")
+    parser.add_argument("--scenario", choices=list(SCENARIOS) + ["all"], default="xray")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=8, help="Unmeasured requests per scenario first")
+    parser.add_argument("--no-explain", dest="explain", action="store_false", help="Send explain=false")
+    parser.add_argument("--upload-delay-ms", type=float, default=300.0, help="Latency of the fake upload")
+    parser.add_argument("--unique-images", type=int, default=64, help="Distinct images per type (repeats hit the cache)")
+    parser.add_argument("--image-size", type=int, default=1024, help="Synthetic X-ray side in pixels")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--url", default=None, help="Benchmark a running server, e.g. http://localhost:8000")
+    parser.add_argument("--server-pid", default=None, help="With --url: PID whose RSS to report")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -0,0 +1,120 @@
+"""
+WORKER MEMORY REPORT
+Starts several worker processes that load and warm up both models the way
+a uvicorn worker does, then reports RSS and PSS per worker with and without
+SHARED_WEIGHTS
+
+RSS counts every resident page a process touches, shared or not; PSS
+splits shared pages between the processes mapping them, so the sum of PSS
+is what the workers really cost the node.
+
+Usage (from backend/, with the model weights in place, Linux only):
+    python benchmark_memory.py [--workers 4] [--json memory_report.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+WORKER_FLAG = "--worker"
+
+
+def run_worker():
+    """Load, warm up and use both models, then idle until the parent is done"""
+    import torch
+
+    import predict
+    import predict_ecg
+    from model_registry import registry
+
+    for name in registry.names():
+        registry.load(name)
+
+    inputs = torch.randn(2, 3, 224, 224)
+    for module in (predict, predict_ecg):
+        try:
+            module.run_batch([(inputs[0], True), (inputs[1], False)])
+        except Exception:
+            pass  # e.g. the ECG model hasn't been trained
+
+    print("ready", flush=True)
+    sys.stdin.read()
+
+
+def memory_kb(pid):
+    """(rss_kb, pss_kb) of a process from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1])
+    return values.get("Rss"), values.get("Pss")
+
+
+def measure(num_workers, shared_weights):
+    env = dict(os.environ, SHARED_WEIGHTS="1" if shared_weights else "0", MODEL_WARMUP="1")
+    workers = [
+        subprocess.Popen(
+            [sys.executable, __file__, WORKER_FLAG],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, text=True,
+        )
+        for _ in range(num_workers)
+    ]
+
+    try:
+        for worker in workers:
+            # Wait for the worker to finish loading; it prints a few lines first
+            for line in worker.stdout:
+                if line.strip() == "ready":
+                    break
+        samples = [memory_kb(worker.pid) for worker in workers]
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+
+    return {
+        "shared_weights": shared_weights,
+        "workers": [{"rss_mb": round(rss / 1024, 1), "pss_mb": round(pss / 1024, 1)} for rss, pss in samples],
+        "total_rss_mb": round(sum(rss for rss, _ in samples) / 1024, 1),
+        "total_pss_mb": round(sum(pss for _, pss in samples) / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    if WORKER_FLAG in sys.argv:
+        run_worker()
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="RSS/PSS per worker with and without shared weights")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print(f"WORKER MEMORY ({args.workers} workers, X-ray + ECG models)")
+    print("="*60)
+
+    report = {"workers": args.workers, "runs": []}
+    for shared_weights in (False, True):
+        run = measure(args.workers, shared_weights)
+        report["runs"].append(run)
+
+        mode = "SHARED_WEIGHTS=1" if shared_weights else "SHARED_WEIGHTS=0"
+        print(f"\n{mode}")
+        for i, worker in enumerate(run["workers"]):
+            print(f"  worker {i}: RSS {worker['rss_mb']:>8.1f} MB   PSS {worker['pss_mb']:>8.1f} MB")
+        print(f"  total:    RSS {run['total_rss_mb']:>8.1f} MB   PSS {run['total_pss_mb']:>8.1f} MB")
+
+    private, shared = report["runs"]
+    saved = private["total_pss_mb"] - shared["total_pss_mb"]
+    print(f"\nShared weights save {saved:.1f} MB of PSS across {args.workers} workers")
+    print("="*60)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
@@ -0,0 +1,163 @@
+"""
+PREPROCESSING MICROBENCHMARK
+Per-stage timings of the previous X-ray preprocessing (full decode, HSV
+conversion + ImageStat, per-call transforms.Compose) against the one-pass
+pipeline in preprocessing.py, plus how often the X-ray model's predicted
+label changes between the two on a folder of real scans
+
+Usage (from backend/; the agreement check needs the X-ray weights):
+    python benchmark_preprocessing.py [--validation-dir ../chest_xray/test] [--limit 500]
+"""
+
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image, ImageStat
+from torchvision import transforms
+
+import predict
+from architectures import build_xray_model
+from model_registry import load_checkpoint
+from preprocessing import IMAGE_SIZE, MEAN, STD, load_image, check_xray, to_tensor, preprocess
+
+SIZES = [(1024, 1024), (2048, 1800), (3000, 2500)]
+FORMATS = ["JPEG", "PNG"]
+REPEATS = 10
+AGREEMENT_BATCH_SIZE = 32
+IMAGE_EXTENSIONS = (".jpeg", ".jpg", ".png")
+
+
+def synthetic_xray(width, height, fmt):
+    """Smooth grey structure plus noise, encoded like an uploaded scan"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = 128 + 60 * np.sin(x / 150.0) * np.cos(y / 200.0) + rng.normal(0, 12, (height, width))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, quality=90) if fmt == "JPEG" else image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+# ---- Previous pipeline, split into stages ----
+
+def old_decode(data):
+    return Image.open(io.BytesIO(data)).convert("RGB")
+
+def old_validate(image):
+    stat = ImageStat.Stat(image.convert("HSV"))
+    return stat.mean[1], stat.stddev[2]
+
+def old_transform(image):
+    transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(MEAN, STD)
+    ])
+    return transform(image)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(data):
+    stages = {"old": {"decode": 0.0, "validate": 0.0, "normalize": 0.0}, "new": {"decode": 0.0, "validate": 0.0, "normalize": 0.0}}
+    batch = torch.empty(1, 3, IMAGE_SIZE, IMAGE_SIZE)  # preallocated batch tensor
+
+    for _ in range(REPEATS):
+        image, t = timed(old_decode, data); stages["old"]["decode"] += t
+        _, t = timed(old_validate, image); stages["old"]["validate"] += t
+        old, t = timed(old_transform, image); stages["old"]["normalize"] += t
+
+        pixels, t = timed(load_image, data); stages["new"]["decode"] += t
+        _, t = timed(check_xray, pixels); stages["new"]["validate"] += t
+        _, t = timed(to_tensor, pixels, batch[0]); stages["new"]["normalize"] += t
+
+    for pipeline in stages.values():
+        for stage in pipeline:
+            pipeline[stage] /= REPEATS
+    return stages, (old - batch[0]).abs().max().item()
+
+
+def validation_images(root, limit):
+    paths = []
+    for directory, _, files in os.walk(root):
+        paths.extend(os.path.join(directory, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)[:limit]
+
+
+def label_agreement(paths):
+    """
+    X-ray model predictions on the previous pipeline's inputs vs preprocess()
+
+    Returns:
+        dict: images compared, label changes, largest input and probability
+              differences
+    """
+    model, _ = load_checkpoint(build_xray_model, predict.MODEL_PATH, predict.MODEL_VERSION)
+    result = {"images": 0, "label_changes": 0, "max_input_diff": 0.0, "max_probability_diff": 0.0}
+
+    for start in range(0, len(paths), AGREEMENT_BATCH_SIZE):
+        old_inputs, new_inputs = [], []
+        for path in paths[start:start + AGREEMENT_BATCH_SIZE]:
+            with open(path, "rb") as f:
+                data = f.read()
+            old_inputs.append(old_transform(old_decode(data)))
+            new_inputs.append(preprocess(data))
+        old_inputs, new_inputs = torch.stack(old_inputs), torch.stack(new_inputs)
+
+        with torch.inference_mode():
+            old_probabilities = torch.softmax(model(old_inputs), dim=1)
+            new_probabilities = torch.softmax(model(new_inputs), dim=1)
+        result["images"] += len(old_inputs)
+        result["label_changes"] += (old_probabilities.argmax(1) != new_probabilities.argmax(1)).sum().item()
+        result["max_input_diff"] = max(result["max_input_diff"], (new_inputs - old_inputs).abs().max().item())
+        result["max_probability_diff"] = max(result["max_probability_diff"], (new_probabilities - old_probabilities).abs().max().item())
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Previous vs one-pass X-ray preprocessing")
+    parser.add_argument("--validation-dir", default=os.path.join("..", "chest_xray", "test"), help="Scans for the label agreement check")
+    parser.add_argument("--limit", type=int, default=500, help="Most scans compared")
+    args = parser.parse_args()
+
+    print("\n" + "="*78)
+    print("X-RAY PREPROCESSING: BEFORE vs AFTER (ms per image)")
+    print("="*78)
+    print(f"{'input':<16} {'pipeline':<9} {'decode':>9} {'validate':>9} {'normalize':>10} {'total':>9} {'speedup':>8} {'max diff':>9}")
+
+    for width, height in SIZES:
+        for fmt in FORMATS:
+            stages, max_diff = run(synthetic_xray(width, height, fmt))
+            old_total = sum(stages["old"].values())
+            new_total = sum(stages["new"].values())
+            label = f"{width}x{height} {fmt}"
+            for name in ("old", "new"):
+                s = stages[name]
+                total = sum(s.values())
+                speedup = f"{old_total / new_total:.1f}x" if name == "new" else ""
+                diff = f"{max_diff:.3f}" if name == "new" else ""
+                print(f"{label:<16} {name:<9} {s['decode']:>9.2f} {s['validate']:>9.2f} {s['normalize']:>10.2f} {total:>9.2f} {speedup:>8} {diff:>9}")
+                label = ""
+
+    print("="*78)
+    print("max diff: largest difference of the normalised input tensors (JPEGs are")
+    print("decoded at reduced DCT scale, so they differ slightly from a full decode)")
+
+    paths = validation_images(args.validation_dir, args.limit)
+    if not paths or not os.path.exists(predict.MODEL_PATH):
+        print(f"\nLabel agreement skipped (needs scans under {args.validation_dir} and {predict.MODEL_PATH})")
+    else:
+        agreement = label_agreement(paths)
+        print(f"\nLabel agreement on {agreement['images']} scans from {args.validation_dir}:")
+        print(f"  predicted label changed on {agreement['label_changes']} "
+              f"({agreement['label_changes'] / agreement['images'] * 100:.2f}%), "
+              f"max input diff {agreement['max_input_diff']:.3f}, "
+              f"max probability diff {agreement['max_probability_diff']:.4f}")
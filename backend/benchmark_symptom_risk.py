@@ -0,0 +1,160 @@
+"""
+SYMPTOM RISK SCORING BENCHMARK
+Throughput of the previous per-call keyword scan against the precompiled
+matcher in symptom_risk.py (one text at a time and score_batch), on a
+synthetic symptom journal, and a check that every result is identical
+
+Usage:
+    python benchmark_symptom_risk.py [--entries 20000] [--json symptom_risk_report.json]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from symptom_risk import SYMPTOM_KEYWORDS, score, score_batch
+
+FILLER = [
+    "since", "yesterday", "morning", "my", "the", "and", "a", "little", "bit", "feeling",
+    "after", "walking", "at", "night", "worse", "better", "than", "before", "doctor", "today",
+    "sore", "throat", "headache", "dizzy", "nausea", "appetite", "sleep", "pills", "water", "week",
+]
+REPEATS = 3
+
+
+# ---- Previous implementation (predict.analyze_symptoms before symptom_risk.py) ----
+
+def old_analyze_symptoms(symptom_text):
+    if not symptom_text:
+        return {
+            "risk_category": "Unknown",
+            "risk_score": 0.0,
+            "matched_symptoms": [],
+            "additional_concerns": []
+        }
+
+    text = symptom_text.lower()
+
+    symptom_keywords = {
+        "severe": ["severe", "intense", "extreme", "unbearable", "acute"],
+        "respiratory": ["cough", "breath", "breathing", "shortness", "wheez", "dyspnea"],
+        "fever": ["fever", "temperature", "hot", "chills", "sweating"],
+        "pain": ["pain", "chest pain", "ache", "discomfort", "hurt"],
+        "fatigue": ["tired", "fatigue", "weak", "exhausted", "lethargy"],
+        "mucus": ["mucus", "phlegm", "sputum", "discharge"],
+        "emergency": ["blood", "hemoptysis", "confusion", "unconscious", "severe pain"]
+    }
+
+    matched = []
+    risk_score = 0.0
+
+    for category, keywords in symptom_keywords.items():
+        for keyword in keywords:
+            if keyword in text:
+                matched.append(category)
+                if category == "emergency":
+                    risk_score += 0.4
+                elif category == "severe":
+                    risk_score += 0.3
+                elif category in ["respiratory", "fever", "pain"]:
+                    risk_score += 0.2
+                else:
+                    risk_score += 0.1
+                break
+
+    risk_score = min(risk_score, 1.0)
+
+    if risk_score >= 0.7:
+        risk_category = "High"
+    elif risk_score >= 0.4:
+        risk_category = "Moderate"
+    elif risk_score >= 0.1:
+        risk_category = "Low"
+    else:
+        risk_category = "Minimal"
+
+    return {
+        "risk_category": risk_category,
+        "risk_score": risk_score,
+        "matched_symptoms": list(set(matched)),
+        "additional_concerns": ["Seek immediate medical attention" if risk_score >= 0.7 else "Monitor symptoms closely"]
+    }
+
+
+# ---- Synthetic journal ----
+
+def synthetic_journal(entries, seed=0):
+    """
+    Journal-like entries mixing filler words, keywords (mixed case, glued to
+    neighbours, overlapping like "severe pain") and some empty/repeated ones
+    """
+    rng = random.Random(seed)
+    keywords = [keyword for words in SYMPTOM_KEYWORDS.values() for keyword in words]
+    journal = []
+    for _ in range(entries):
+        roll = rng.random()
+        if roll < 0.02:
+            journal.append(rng.choice(["", None, "   "]))
+            continue
+        if roll < 0.1 and journal:
+            journal.append(rng.choice(journal))
+            continue
+        words = []
+        for _ in range(rng.randint(5, 60)):
+            word = rng.choice(keywords) if rng.random() < 0.12 else rng.choice(FILLER)
+            if rng.random() < 0.1:
+                word = word.upper() if rng.random() < 0.5 else word.capitalize()
+            words.append(word)
+        separator = "" if rng.random() < 0.05 else " "
+        journal.append(separator.join(words) + rng.choice([".", "!", "", "..."]))
+    return journal
+
+
+def entries_per_second(fn, journal):
+    """Best of REPEATS runs of fn(journal)"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(journal)
+        best = min(best, time.perf_counter() - start)
+    return len(journal) / best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Previous vs precompiled symptom risk scoring")
+    parser.add_argument("--entries", type=int, default=20000, help="Synthetic journal entries to score")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    journal = synthetic_journal(args.entries)
+
+    expected = [old_analyze_symptoms(text) for text in journal]
+    mismatches = sum(1 for text, reference in zip(journal, expected) if score(text) != reference)
+    mismatches += sum(1 for result, reference in zip(score_batch(journal), expected) if result != reference)
+
+    rows = {
+        "previous": entries_per_second(lambda texts: [old_analyze_symptoms(text) for text in texts], journal),
+        "precompiled": entries_per_second(lambda texts: [score(text) for text in texts], journal),
+        "precompiled batch": entries_per_second(score_batch, journal),
+    }
+
+    print("\n" + "="*64)
+    print(f"SYMPTOM RISK SCORING ({len(journal)} entries, "
+          f"{sum(len(text or '') for text in journal) / len(journal):.0f} chars avg)")
+    print("="*64)
+    print(f"  {'scorer':<20} {'entries/s':>12} {'speedup':>9}")
+    for name, rate in rows.items():
+        print(f"  {name:<20} {rate:>12,.0f} {rate / rows['previous']:>8.2f}x")
+    print("="*64)
+    print(f"{'✓' if not mismatches else '⚠'} {mismatches} result(s) differ from the previous implementation")
+
+    if args.json:
+        report = {
+            "entries": len(journal),
+            "entries_per_second": {name: round(rate, 1) for name, rate in rows.items()},
+            "mismatches": mismatches,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
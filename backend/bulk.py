@@ -0,0 +1,217 @@
+"""
+BULK PREDICTION
+Runs many uploaded scans (or the images inside zip archives) through the
+X-ray or ECG model and streams one JSON line per image as results finish
+"""
+
+import asyncio
+import json
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import predict  # registers the "xray" model
+import predict_ecg
+from metrics import stage
+from grayscale_model import is_grayscale
+from model_registry import registry
+from preprocessing import example_batch, preprocess
+from settings import BULK_BATCH_SIZE, BULK_DECODE_WORKERS, BULK_MAX_IMAGES, BULK_MAX_IMAGE_MB
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+# Decoding pool shared by all bulk requests, separate from the inference pool
+decode_pool = ThreadPoolExecutor(max_workers=BULK_DECODE_WORKERS, thread_name_prefix="bulk-decode")
+
+# ============================================================
+# PER-MODEL RESULTS
+# ============================================================
+
+def xray_summary(probabilities):
+    prediction_idx = int(probabilities.argmax())
+    return {
+        "prediction": "PNEUMONIA" if prediction_idx == 1 else "NORMAL",
+        "confidence": round(probabilities[prediction_idx].item() * 100, 2),
+        "normal_probability": round(probabilities[0].item() * 100, 2),
+        "pneumonia_probability": round(probabilities[1].item() * 100, 2),
+    }
+
+
+def ecg_summary(probabilities):
+    prediction_idx = int(probabilities.argmax())
+    label = predict_ecg.CLASS_NAMES[prediction_idx]
+    confidence = probabilities[prediction_idx].item()
+    return {
+        "prediction": label,
+        "confidence": round(confidence * 100, 2),
+        "risk_level": predict_ecg.generate_report(label, confidence)["risk_level"],
+    }
+
+
+MODELS = {
+    "xray": {"validate_xray": True, "summary": xray_summary},
+    "ecg": {"validate_xray": False, "summary": ecg_summary},
+}
+
+# ============================================================
+# INPUTS
+# ============================================================
+
+def iter_images(uploads):
+    """
+    (filename, read) pairs for every image in the uploads, opening zip
+    archives lazily so members are only decompressed when they are read
+
+    `read()` returns the image bytes (or raises for unusable members).
+    """
+    for upload in uploads:
+        name = upload.filename or "upload"
+        if name.lower().endswith(".zip") or zipfile.is_zipfile(upload.file):
+            upload.file.seek(0)
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile as e:
+                yield name, _raiser(ValueError(f"Invalid zip archive: {e}"))
+                continue
+            for info in archive.infolist():
+                if info.is_dir() or info.filename.startswith("__MACOSX/") or os.path.basename(info.filename).startswith("."):
+                    continue
+                if not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                yield f"{name}/{info.filename}", _zip_reader(archive, info)
+        else:
+            upload.file.seek(0)
+            yield name, upload.file.read
+
+
+def _zip_reader(archive, info):
+    def read():
+        # Checked before decompressing, so a zip bomb can't exhaust memory
+        if info.file_size > BULK_MAX_IMAGE_MB * 1024 * 1024:
+            raise ValueError(f"Image larger than {BULK_MAX_IMAGE_MB} MB")
+        return archive.read(info)
+    return read
+
+
+def _raiser(error):
+    def read():
+        raise error
+    return read
+
+
+def _load(read, name):
+    grayscale = is_grayscale(registry.get(name).model)
+    return preprocess(read(), validate_xray=MODELS[name]["validate_xray"], model=name, grayscale=grayscale)
+
+# ============================================================
+# STREAMING
+# ============================================================
+
+def _infer(name, batch):
+    """Label-only forward pass over a ready batch tensor"""
+    loaded = registry.get(name)
+    with torch.inference_mode(), stage(name, "forward"):
+        probabilities = torch.softmax(loaded.infer_model(batch), dim=1)
+    return probabilities, loaded.version
+
+
+async def stream_predictions(name, uploads, run_inference):
+    """
+    Async generator of NDJSON lines, one per image plus a final summary
+
+    Images are decoded and validated in `decode_pool` a bounded window ahead
+    of the model, collected into a preallocated batch tensor and run
+    `BULK_BATCH_SIZE` at a time through `run_inference(fn, *args)` (the
+    server's bounded inference executor). Per-image failures are reported
+    inline as {"index", "filename", "error"} and don't stop the batch.
+    """
+    spec = MODELS[name]
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    counts = {"images": 0, "succeeded": 0, "failed": 0}
+
+    batch = None  # allocated in the model's input format on first use
+    rows = []  # (index, filename, tensor)
+
+    def line(record):
+        return json.dumps(record) + "\n"
+
+    async def flush():
+        nonlocal batch
+        ready = rows[:]
+        rows.clear()
+        lines = []
+
+        def fail(failed, error):
+            for index, filename, _ in failed:
+                counts["failed"] += 1
+                lines.append(line({"index": index, "filename": filename, "error": error}))
+
+        try:
+            # Inputs in another format (e.g. decoded across a grayscale/RGB
+            # model swap) fail on their own instead of ending the stream
+            expected = example_batch(0, is_grayscale(registry.get(name).model))
+            shape, dtype = expected.shape[1:], expected.dtype
+            for row in ready:
+                if row[2].shape != shape or row[2].dtype != dtype:
+                    fail([row], f"Input {tuple(row[2].shape)} {row[2].dtype} does not match the model's {tuple(shape)} {dtype}")
+            ready = [row for row in ready if row[2].shape == shape and row[2].dtype == dtype]
+            if not ready:
+                return "".join(lines)
+
+            if batch is None or batch.shape[1:] != shape or batch.dtype != dtype:
+                batch = torch.empty((BULK_BATCH_SIZE, *shape), dtype=dtype)
+            torch.stack([tensor for _, _, tensor in ready], out=batch[:len(ready)])
+            probabilities, version = await run_inference(_infer, name, batch[:len(ready)])
+        except Exception as e:
+            # e.g. the inference pool is saturated: fail this batch, keep going
+            fail(ready, getattr(e, "detail", None) or str(e))
+        else:
+            for row, (index, filename, _) in enumerate(ready):
+                counts["succeeded"] += 1
+                lines.append(line({"index": index, "filename": filename, **spec["summary"](probabilities[row]), "model_version": version}))
+        return "".join(lines)
+
+    images = iter_images(uploads)
+    pending = deque()
+    window = BULK_BATCH_SIZE * 2
+
+    def fill():
+        while len(pending) < window and counts["images"] < BULK_MAX_IMAGES:
+            try:
+                filename, read = next(images)
+            except StopIteration:
+                return
+            future = loop.run_in_executor(decode_pool, _load, read, name)
+            pending.append((counts["images"], filename, future))
+            counts["images"] += 1
+
+    fill()
+    while pending:
+        index, filename, future = pending.popleft()
+        fill()
+        try:
+            tensor = await future
+        except Exception as e:
+            counts["failed"] += 1
+            yield line({"index": index, "filename": filename, "error": str(e)})
+            continue
+
+        rows.append((index, filename, tensor))
+        if len(rows) == BULK_BATCH_SIZE:
+            yield await flush()
+
+    if rows:
+        yield await flush()
+
+    truncated = next(images, None) is not None
+    yield line({"summary": {
+        **counts,
+        "truncated": truncated,
+        "max_images": BULK_MAX_IMAGES,
+        "seconds": round(time.perf_counter() - started, 3),
+    }})
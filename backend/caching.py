@@ -0,0 +1,63 @@
+"""
+CACHING HELPERS
+Small thread-safe in-memory caches shared by the prediction modules
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Fixed-size mapping that evicts the least recently used entry
+
+    With `max_bytes` the values (bytes) are also capped by total length;
+    a value larger than the whole budget is not cached at all.
+    """
+
+    def __init__(self, max_items=128, max_bytes=None):
+        self.max_items = max(1, int(max_items))
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            self.pop(key)
+            return
+        with self._lock:
+            self._bytes += self._size(value) - self._size(self._data.get(key))
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self._bytes -= self._size(value)
+            return value
+
+    def _size(self, value):
+        return len(value) if self.max_bytes is not None and value is not None else 0
+
+    @property
+    def nbytes(self):
+        """Total length of the cached values (0 without max_bytes)"""
+        with self._lock:
+            return self._bytes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
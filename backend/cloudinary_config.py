@@ -1,6 +1,16 @@
+import hashlib
+import json
+import os
+import time
+import certifi
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cloudinary.utils
+import urllib3
+
+from settings import UPLOAD_BACKEND, UPLOAD_FOLDER, UPLOAD_WORKERS, LOCAL_UPLOAD_DELAY_MS
+from upload_store import sniff_extension
 
 # Configure Cloudinary
 cloudinary.config(
@@ -10,26 +20,98 @@ cloudinary.config(
     secure=True
 )
 
-def upload_to_cloudinary(file_path, folder="healthcare", resource_type="image"):
+# Our own keep-alive pool for uploads, sized for the background upload
+# workers so parallel uploads reuse connections instead of opening (and
+# discarding) a new one each time. Uploads are signed with the SDK's public
+# api_sign_request and posted to the documented REST endpoint.
+upload_pool = urllib3.PoolManager(maxsize=UPLOAD_WORKERS, cert_reqs="CERT_REQUIRED", ca_certs=certifi.where())
+UPLOAD_TIMEOUT = urllib3.Timeout(connect=10, read=120)
+
+# Inside the /uploaded_images mount; UploadStore leaves it alone
+LOCAL_UPLOAD_DIR = "local_cloudinary"
+
+def read_upload(file_path, filename=None):
+    """(bytes, filename) from a file path, bytes or a file-like object"""
+    if isinstance(file_path, str):
+        with open(file_path, "rb") as f:
+            return f.read(), filename or os.path.basename(file_path)
+    if hasattr(file_path, "read"):
+        return file_path.read(), filename
+    return bytes(file_path), filename
+
+def upload_to_local(file_path, folder="healthcare", filename=None):
+    """
+    Local stand-in for Cloudinary (UPLOAD_BACKEND=local)
+    
+    Writes the file under UPLOAD_FOLDER/local_cloudinary/<folder>/, named by
+    its content hash so uploads that share a client filename never overwrite
+    each other, after an optional artificial delay. Returns the same shape
+    as upload_to_cloudinary.
+    """
+    if LOCAL_UPLOAD_DELAY_MS > 0:
+        time.sleep(LOCAL_UPLOAD_DELAY_MS / 1000.0)
+    
+    try:
+        data, filename = read_upload(file_path, filename)
+        digest = hashlib.sha256(data).hexdigest()
+        ext = sniff_extension(data, filename)
+        relative_path = f"{LOCAL_UPLOAD_DIR}/{folder}/{digest}{ext}"
+        local_path = os.path.join(UPLOAD_FOLDER, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, local_path)
+        
+        return {
+            "success": True,
+            "url": f"http://localhost:8000/uploaded_images/{relative_path}",
+            "public_id": f"{folder}/{digest}",
+            "format": ext.lstrip("."),
+            "resource_type": "image"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def upload_to_cloudinary(file_path, folder="healthcare", resource_type="image", filename=None):
     """
     Upload a file to Cloudinary
     
     Args:
-        file_path: Path to the file to upload
+        file_path: Path to the file to upload, or the file's bytes /
+                   a file-like object to stream it from memory
         folder: Cloudinary folder name
         resource_type: Type of resource (image, raw, video, auto)
+        filename: Original file name, used for in-memory uploads
     
     Returns:
         dict: Upload result with secure_url, public_id, etc.
     """
+    if UPLOAD_BACKEND == "local":
+        return upload_to_local(file_path, folder=folder, filename=filename)
+    
     try:
-        result = cloudinary.uploader.upload(
-            file_path,
-            folder=folder,
-            resource_type=resource_type,
-            overwrite=True,
-            invalidate=True
+        data, filename = read_upload(file_path, filename)
+        config = cloudinary.config()
+        params = {"folder": folder, "invalidate": "true", "overwrite": "true", "timestamp": str(int(time.time()))}
+        params["signature"] = cloudinary.utils.api_sign_request(params, config.api_secret)
+        params["api_key"] = config.api_key
+        api_url = f"{config.upload_prefix or 'https://api.cloudinary.com'}/v1_1/{config.cloud_name}/{resource_type}/upload"
+        
+        response = upload_pool.request(
+            "POST", api_url,
+            fields={**params, "file": (filename or "file", data)},
+            timeout=UPLOAD_TIMEOUT,
         )
+        result = json.loads(response.data.decode("utf-8"))
+        if "error" in result:
+            return {
+                "success": False,
+                "error": result["error"].get("message", f"HTTP {response.status}")
+            }
         return {
             "success": True,
             "url": result.get("secure_url"),
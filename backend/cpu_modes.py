@@ -0,0 +1,114 @@
+"""
+CPU INFERENCE MODES
+Optional channels-last memory format and bfloat16 autocast for the eager
+models (both the label-only path and GradCAM)
+
+oneDNN runs convolutions natively on NHWC tensors, so channels-last skips
+the layout reorders around every conv; on CPUs with AVX512-BF16 or AMX,
+bfloat16 autocast additionally halves the memory traffic of the conv and
+linear layers. Each mode is checked against the fp32 model when it is
+applied and dropped if the predictions drift.
+"""
+
+from contextlib import nullcontext
+
+import torch
+
+from grayscale_model import is_grayscale
+from preprocessing import example_batch
+from settings import BF16_AUTOCAST, CHANNELS_LAST
+
+# Largest difference in class probability accepted against fp32
+TOLERANCE = {"channels_last": 1e-4, "bf16": 2e-2}
+
+
+def bf16_supported():
+    """True if oneDNN can run bfloat16 kernels on this CPU"""
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class CpuModeModel(torch.nn.Module):
+    """
+    Runs `model` on channels-last inputs and/or under bf16 autocast
+
+    Logits are always returned as fp32. Hooks on the wrapped model's layers
+    (GradCAM) keep working; under autocast their activations are bf16.
+    """
+
+    def __init__(self, model, channels_last=False, bf16=False):
+        super().__init__()
+        self.model = model
+        self.channels_last = channels_last
+        self.bf16 = bf16
+
+    def forward(self, batch):
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        autocast = torch.autocast("cpu", dtype=torch.bfloat16) if self.bf16 else nullcontext()
+        with autocast:
+            output = self.model(batch)
+        return output.float()
+
+
+def mode_name(channels_last, bf16):
+    parts = (["channels_last"] if channels_last else []) + (["bf16"] if bf16 else [])
+    return "+".join(parts) or "fp32"
+
+
+def wrap(model, channels_last=False, bf16=False):
+    """
+    `model` converted for the requested mode (no checks)
+
+    Channels-last converts the conv weights in place, so with SHARED_WEIGHTS
+    they are copied out of the shared mapping into private memory.
+    """
+    if not (channels_last or bf16):
+        return model
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return CpuModeModel(model, channels_last, bf16)
+
+
+def apply_cpu_mode(model, infer_model, label, channels_last=CHANNELS_LAST, bf16=BF16_AUTOCAST):
+    """
+    Apply CHANNELS_LAST / BF16_AUTOCAST to the eager model
+
+    `infer_model` is wrapped too when it is the eager model (quantized and
+    exported graphs are left alone). Unsupported or drifting modes fall
+    back, bf16 first, then channels-last.
+
+    Returns:
+        (model, infer_model)
+    """
+    if bf16 and not bf16_supported():
+        print(f"⚠ bfloat16 is not supported on this CPU, running the {label} model in fp32")
+        bf16 = False
+    if not (channels_last or bf16):
+        return model, infer_model
+
+    # fp32 NCHW reference probabilities, before any conversion
+    generator = torch.Generator().manual_seed(0)
+    inputs = example_batch(4, is_grayscale(model), generator)
+    with torch.inference_mode():
+        expected = torch.softmax(model(inputs), dim=1)
+
+    while channels_last or bf16:
+        candidate = wrap(model, channels_last, bf16)
+        with torch.inference_mode():
+            difference = (torch.softmax(candidate(inputs), dim=1) - expected).abs().max().item()
+        tolerance = TOLERANCE["bf16" if bf16 else "channels_last"]
+        name = mode_name(channels_last, bf16)
+        if difference <= tolerance:
+            print(f"✓ Running the {label} model in {name} mode (max probability diff {difference:.1e})")
+            return candidate, candidate if infer_model is model else infer_model
+        print(f"⚠ {name} {label} model differs from fp32 by {difference:.2e} (> {tolerance:.0e}), falling back")
+        if bf16:
+            bf16 = False
+        else:
+            channels_last = False
+
+    model.to(memory_format=torch.contiguous_format)
+    return model, infer_model
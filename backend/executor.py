@@ -0,0 +1,77 @@
+"""
+INFERENCE EXECUTOR
+Bounded thread pool that keeps blocking model calls off the event loop
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import EXECUTOR_QUEUE_WAIT_SECONDS, EXECUTOR_REJECTIONS
+
+
+class ExecutorBusy(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class InferenceExecutor:
+    """
+    Runs synchronous inference functions in a fixed pool of threads
+
+    At most `max_workers` calls run at once and at most `max_queue` more may
+    wait for a worker; anything beyond that is rejected with ExecutorBusy so
+    callers can shed load instead of piling up unbounded work. `prepare`, if
+    given, is called on the worker thread before every call.
+    """
+
+    def __init__(self, max_workers=8, max_queue=32, prepare=None):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.prepare = prepare
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` in the pool and await its result"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                EXECUTOR_REJECTIONS.labels().inc()
+                raise ExecutorBusy("Inference queue is full, please retry shortly")
+            self._pending += 1
+
+        try:
+            future = self._pool.submit(self._timed, time.perf_counter(), functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+
+        # Free the slot when the work actually finishes, even if the
+        # awaiting request was cancelled in the meantime
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _timed(self, queued, call):
+        EXECUTOR_QUEUE_WAIT_SECONDS.labels().observe(time.perf_counter() - queued)
+        if self.prepare is not None:
+            self.prepare()
+        return call()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(pending, self.max_workers),
+            "queued": max(0, pending - self.max_workers),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
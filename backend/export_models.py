@@ -0,0 +1,143 @@
+"""
+MODEL EXPORT
+Folds Conv+BatchNorm, strips Dropout and exports frozen inference graphs
+(TorchScript and ONNX) for the X-ray and ECG models, checked numerically
+against the eager model
+
+Usage (from backend/):
+    python export_models.py
+
+Serve an export with INFERENCE_BACKEND=torchscript or INFERENCE_BACKEND=onnxruntime.
+The ONNX export is skipped unless `pip install onnx onnxruntime` has been run.
+"""
+
+import copy
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from architectures import build_xray_model, build_ecg_model
+from inference_backends import EXPORT_TOLERANCE, exported_path, load_exported_model, max_logit_difference
+
+MODELS = {
+    "xray": {"build": build_xray_model, "checkpoint": "xray_pneumonia_model.pth"},
+    "ecg": {"build": build_ecg_model, "checkpoint": "ecg_resnet_model.pth"},
+}
+
+LATENCY_REPEATS = 20
+
+# ============================================================
+# GRAPH OPTIMIZATION
+# ============================================================
+
+def fold_batchnorm(model):
+    """Fold every ResNet BatchNorm into the convolution before it"""
+    model.conv1 = fuse_conv_bn_eval(model.conv1, model.bn1)
+    model.bn1 = nn.Identity()
+
+    for layer in (model.layer1, model.layer2, model.layer3, model.layer4):
+        for block in layer:
+            block.conv1 = fuse_conv_bn_eval(block.conv1, block.bn1)
+            block.bn1 = nn.Identity()
+            block.conv2 = fuse_conv_bn_eval(block.conv2, block.bn2)
+            block.bn2 = nn.Identity()
+            if block.downsample is not None:
+                conv, bn = block.downsample
+                block.downsample = nn.Sequential(fuse_conv_bn_eval(conv, bn))
+    return model
+
+
+def strip_dropout(module):
+    """Replace Dropout (a no-op in eval mode) with Identity"""
+    for name, child in module.named_children():
+        if isinstance(child, nn.Dropout):
+            setattr(module, name, nn.Identity())
+        else:
+            strip_dropout(child)
+    return module
+
+
+def optimize_for_export(model):
+    optimized = copy.deepcopy(model).eval()
+    return strip_dropout(fold_batchnorm(optimized))
+
+# ============================================================
+# EXPORT
+# ============================================================
+
+def export_torchscript(model, path):
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, torch.randn(1, 3, 224, 224))
+    # Freezing inlines the weights as constants, so the JIT can fold them further
+    torch.jit.save(torch.jit.freeze(traced.eval()), path)
+
+
+def export_onnx(model, path):
+    torch.onnx.export(
+        model,
+        (torch.randn(1, 3, 224, 224),),
+        path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+        dynamo=False,
+    )
+
+
+def measure_latency(model, batch_size=8):
+    """Mean milliseconds per image"""
+    inputs = torch.randn(batch_size, 3, 224, 224)
+    with torch.inference_mode():
+        for _ in range(3):
+            model(inputs)
+        start = time.perf_counter()
+        for _ in range(LATENCY_REPEATS):
+            model(inputs)
+    return (time.perf_counter() - start) / LATENCY_REPEATS / batch_size * 1000
+
+
+def export_model(name, config):
+    print("\n" + "="*60)
+    print(f"EXPORTING {name.upper()} MODEL")
+    print("="*60)
+
+    if not os.path.exists(config["checkpoint"]):
+        print(f"Checkpoint not found: {config['checkpoint']}")
+        return
+
+    model = config["build"]()
+    model.load_state_dict(torch.load(config["checkpoint"], map_location="cpu"))
+    model.eval()
+    print(f"eager:       {measure_latency(model):.2f} ms/img")
+
+    optimized = optimize_for_export(model)
+    print(f"fused eager: max diff {max_logit_difference(model, optimized):.1e}")
+
+    exporters = {"torchscript": export_torchscript, "onnxruntime": export_onnx}
+    for backend, export in exporters.items():
+        path = exported_path(config["checkpoint"], backend)
+        try:
+            export(optimized, path)
+            exported = load_exported_model(config["checkpoint"], backend)
+        except Exception as e:
+            if os.path.exists(path):
+                os.remove(path)
+            print(f"⚠ {backend}: export failed ({e})")
+            continue
+
+        difference = max_logit_difference(model, exported, batch_size=4)
+        if difference > EXPORT_TOLERANCE:
+            os.remove(path)
+            print(f"✗ {backend}: max diff {difference:.2e} exceeds {EXPORT_TOLERANCE} - removed")
+            continue
+
+        print(f"✓ {backend}: {measure_latency(exported):.2f} ms/img, max diff {difference:.1e} - saved {path}")
+
+
+if __name__ == "__main__":
+    for name, config in MODELS.items():
+        export_model(name, config)
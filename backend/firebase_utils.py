@@ -7,6 +7,12 @@ import os
 db = None
 bucket = None
 
+class EmulatorCredentials(credentials.Base):
+    """No-op credentials for the local Firestore emulator (FIRESTORE_EMULATOR_HOST)"""
+    def get_credential(self):
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+
 def initialize_firebase():
     global db, bucket
     
@@ -14,6 +20,15 @@ def initialize_firebase():
     if firebase_admin._apps:
         return
 
+    # Local emulator: no service account needed, the client connects to
+    # FIRESTORE_EMULATOR_HOST by itself
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "demo-mediexpert")
+        firebase_admin.initialize_app(EmulatorCredentials(), {"projectId": project_id})
+        db = firestore.client()
+        print(f"Firebase Admin connected to the Firestore emulator at {os.getenv('FIRESTORE_EMULATOR_HOST')} (project {project_id})")
+        return
+
     # Check for service account file
     cred_path = "serviceAccountKey.json"
     if not os.path.exists(cred_path):
@@ -0,0 +1,163 @@
+"""
+GRADCAM
+Per-call activation/gradient capture, safe to use from many threads at once,
+and batched CAM computation shared by the X-ray and ECG predictors
+"""
+
+import base64
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+def compute_cams(gradients, activations, size=(224, 224)):
+    """
+    GradCAM maps for a whole batch
+
+    Channel weights are the spatially averaged gradients; the weighted sum
+    over channels is a single tensor contraction instead of a Python loop.
+    Maps are ReLU'd, bilinearly upsampled and scaled to [0, 1] per sample,
+    all in torch, so only the final array leaves it for the colormap.
+
+    Args:
+        gradients: (N, C, h, w) gradients w.r.t. the target layer
+        activations: (N, C, h, w) target layer outputs
+        size: (height, width) of the returned maps, or None to keep the
+              layer's (h, w) resolution (see render_cam)
+
+    Returns:
+        np.ndarray: (N, height, width) float32 maps in [0, 1]
+    """
+    with torch.no_grad():
+        # fp32 maps even when the model ran under bf16 autocast
+        gradients, activations = gradients.float(), activations.float()
+        weights = gradients.mean(dim=(2, 3))
+        cams = torch.relu(torch.einsum("nc,nchw->nhw", weights, activations))
+        if size is not None:
+            cams = F.interpolate(cams.unsqueeze(1), size=size, mode="bilinear", align_corners=False).squeeze(1)
+
+        # Leave all-zero maps at zero instead of dividing by 0
+        peak = cams.amax(dim=(1, 2), keepdim=True)
+        cams = cams / torch.where(peak > 0, peak, torch.ones_like(peak))
+    return cams.float().cpu().numpy()
+
+
+def render_cam(cam, size=(224, 224)):
+    """
+    Upsample a low-resolution CAM to (height, width) and rescale to [0, 1]
+
+    Gives the same map compute_cams would have returned at that size, since
+    the per-sample rescaling happens after the interpolation either way.
+    """
+    with torch.no_grad():
+        cam = torch.as_tensor(np.asarray(cam, dtype=np.float32))[None, None]
+        cam = F.interpolate(cam, size=size, mode="bilinear", align_corners=False)[0, 0]
+        peak = cam.max()
+        return (cam / peak if peak > 0 else cam).numpy()
+
+
+def pack_cam(cam):
+    """Low-resolution CAM as JSON: float16 values, base64-encoded (~130 chars for 7x7)"""
+    cam = np.asarray(cam, dtype=np.float16)
+    return {"shape": list(cam.shape), "dtype": "float16", "data": base64.b64encode(cam.tobytes()).decode("ascii")}
+
+
+def unpack_cam(packed):
+    """float32 array back from pack_cam's dict"""
+    data = np.frombuffer(base64.b64decode(packed["data"]), dtype=packed.get("dtype", "float16"))
+    return data.reshape(packed["shape"]).astype(np.float32)
+
+
+def encode_heatmap(cam, ext=".jpg", params=()):
+    """Colour a [0, 1] CAM with the JET colormap and encode it in memory"""
+    heatmap = cv2.applyColorMap(np.uint8(255 * cam), cv2.COLORMAP_JET)
+    ok, buffer = cv2.imencode(ext, heatmap, list(params))
+    if not ok:
+        raise ValueError(f"Could not encode heatmap as {ext}")
+    return buffer.tobytes()
+
+
+class Capture:
+    """Tensors recorded for one forward pass"""
+
+    def __init__(self):
+        self.activations = None
+
+
+class GradCAM:
+    """
+    GradCAM over `target_layer` of a model
+
+    A single forward hook stays registered on the layer, but it only records
+    the output for the thread that is inside a `capture()` block, so parallel
+    requests never see each other's activations. Gradients are taken with
+    torch.autograd.grad against those captured activations instead of
+    backward hooks and `.backward()`, which means nothing shared (module
+    globals or parameter `.grad` buffers) is written during the backward pass.
+
+    Usage:
+        with gradcam.capture() as captured:
+            output = model(batch)
+        cams = gradcam.compute(captured, output, class_idx)
+    """
+
+    def __init__(self, target_layer):
+        self._local = threading.local()
+        self._handle = target_layer.register_forward_hook(self._forward_hook)
+
+    def _forward_hook(self, module, input, output):
+        captured = getattr(self._local, "capture", None)
+        if captured is not None:
+            # Start the autograd graph here: with frozen parameters nothing
+            # before the target layer is recorded, and the layers after it
+            # only keep what the activation gradients need
+            activations = output.detach().requires_grad_(True)
+            captured.activations = activations
+            return activations
+
+    @contextmanager
+    def capture(self):
+        """Record the target layer's output for forward passes in this block"""
+        captured = Capture()
+        previous = getattr(self._local, "capture", None)
+        self._local.capture = captured
+        try:
+            yield captured
+        finally:
+            self._local.capture = previous
+
+    def gradients(self, captured, output, class_idx):
+        """
+        Gradient of each sample's selected logit w.r.t. its activations
+
+        Args:
+            captured: Capture filled by the forward pass that produced `output`
+            output: (N, num_classes) logits
+            class_idx: (N,) long tensor with the class to explain per sample
+
+        Returns:
+            Tensor shaped like captured.activations, e.g. (N, 512, 7, 7)
+        """
+        # Samples don't interact in eval mode, so the gradient of the summed
+        # scores gives every sample its own gradients in one backward pass
+        score = output.gather(1, class_idx.unsqueeze(1)).sum()
+        return torch.autograd.grad(score, captured.activations)[0]
+
+    def compute(self, captured, output, class_idx, size=(224, 224)):
+        """
+        (N, height, width) GradCAM maps for the selected class per sample
+        (size=None keeps the target layer's resolution, e.g. 7x7)
+        """
+        if captured.activations is None:
+            # Fallback empty heatmaps if the hook never fired
+            return torch.zeros((output.shape[0], *(size or (7, 7)))).numpy()
+
+        grads = self.gradients(captured, output, class_idx)
+        return compute_cams(grads, captured.activations.detach(), size)
+
+    def remove(self):
+        self._handle.remove()
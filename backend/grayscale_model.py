@@ -0,0 +1,139 @@
+"""
+GRAYSCALE X-RAY MODEL
+Single-channel variant of the X-ray ResNet18 that takes raw 8-bit grayscale
+pixels instead of ImageNet-normalised RGB
+
+Chest X-rays are grey, so the RGB model sees three identical channels and
+conv1 does three times the work it needs to. Because conv1 is linear,
+    sum_c W_c * ((x / 255 - mean_c) / std_c)
+  = (sum_c W_c / (255 std_c)) * x  -  (sum_c W_c mean_c / std_c) * 1
+so the channels and the normalisation fold into one 1-channel conv plus a
+bias. The bias term is convolved with an all-ones image (zero-padded like
+the original input) once: it is a constant per channel, which becomes the
+conv bias, except in the few border rows/columns the padding reaches, which
+are corrected separately so the result is exact there too. Uploads are then
+decoded straight to 8-bit grey and batched as uint8.
+"""
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from preprocessing import IMAGE_SIZE, MEAN, STD, example_batch
+
+# Largest difference in class probability accepted against the RGB model
+TOLERANCE = 1e-4
+
+
+class GrayscaleStem(nn.Module):
+    """conv1 of the RGB model, folded to take (N, 1, H, W) 0-255 pixels"""
+
+    def __init__(self, conv):
+        super().__init__()
+        if conv.in_channels != 3 or conv.groups != 1 or conv.padding_mode != "zeros":
+            raise ValueError("expected a plain 3-channel conv1")
+        self.stride = conv.stride
+        self.padding = conv.padding
+        self.dilation = conv.dilation
+
+        weight = conv.weight.detach().float()
+        scale = torch.tensor([1 / (255 * s) for s in STD]).view(1, 3, 1, 1)
+        shift = torch.tensor([-m / s for m, s in zip(MEAN, STD)]).view(1, 3, 1, 1)
+        self.weight = nn.Parameter((weight * scale).sum(dim=1, keepdim=True), requires_grad=False)
+        self.register_buffer("shift_weight", (weight * shift).sum(dim=1, keepdim=True))
+        bias = conv.bias.detach().float() if conv.bias is not None else torch.zeros(conv.out_channels)
+        self.register_buffer("bias", bias)
+
+        # Normalisation + bias: constant inside, corrected on the border
+        self._border_size = None
+        self._set_border(IMAGE_SIZE, IMAGE_SIZE)
+
+    def _set_border(self, height, width):
+        ones = torch.ones(1, 1, height, width)
+        bias_map = F.conv2d(ones, self.shift_weight, None, self.stride, self.padding, self.dilation)
+        bias_map = bias_map + self.bias.view(1, -1, 1, 1)
+        out_height, out_width = bias_map.shape[-2:]
+        interior = bias_map[0, :, out_height // 2, out_width // 2]
+        correction = bias_map - interior.view(1, -1, 1, 1)
+
+        def extent(changed):
+            # Leading / trailing rows (or columns) that need correcting
+            changed = changed.tolist()
+            if not any(changed):
+                return 0, 0
+            lead = changed.index(False) if False in changed else len(changed)
+            trail = changed[::-1].index(False) if False in changed else 0
+            return lead, trail
+
+        changed = (correction[0].abs() > 0).any(dim=0)
+        top, bottom = extent(changed[:, out_width // 2])
+        left, right = extent(changed[out_height // 2])
+        self.register_buffer("interior_bias", interior, persistent=False)
+        self.register_buffer("correction", correction, persistent=False)
+        self._border = (top, out_height - bottom, left, out_width - right)
+        self._border_size = (height, width)
+
+    def forward(self, pixels):
+        if tuple(pixels.shape[-2:]) != self._border_size:
+            self._set_border(*pixels.shape[-2:])
+        out = F.conv2d(pixels.float(), self.weight, self.interior_bias, self.stride, self.padding, self.dilation)
+        top, bottom, left, right = self._border
+        correction = self.correction.to(out.dtype)
+        # In place: conv1 output never needs a gradient (GradCAM hooks layer4)
+        out[:, :, :top] += correction[:, :, :top]
+        out[:, :, bottom:] += correction[:, :, bottom:]
+        out[:, :, top:bottom, :left] += correction[:, :, top:bottom, :left]
+        out[:, :, top:bottom, right:] += correction[:, :, top:bottom, right:]
+        return out
+
+
+def to_grayscale(model):
+    """Replace conv1 of an RGB ResNet with a GrayscaleStem, in place"""
+    model.conv1 = GrayscaleStem(model.conv1)
+    return model
+
+
+def is_grayscale(model):
+    """True if `model` (or a model it wraps) takes 8-bit grayscale input"""
+    return isinstance(model, nn.Module) and any(isinstance(module, GrayscaleStem) for module in model.modules())
+
+
+def rgb_equivalent(pixels):
+    """The normalised RGB batch the RGB model gets for (N, 1, H, W) uint8 pixels"""
+    mean = torch.tensor(MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(STD).view(1, 3, 1, 1)
+    return (pixels.float().expand(-1, 3, -1, -1) / 255 - mean) / std
+
+
+def apply_grayscale(model, label):
+    """
+    Convert `model` in place, unless the grayscale outputs drift from RGB
+
+    Compared on random grey images fed to the RGB model as three identical
+    normalised channels. Only conv1 is replaced, so shared (memory-mapped)
+    weights stay shared.
+
+    Returns:
+        `model` (check the outcome with is_grayscale)
+    """
+    generator = torch.Generator().manual_seed(0)
+    pixels = example_batch(4, grayscale=True, generator=generator)
+    with torch.inference_mode():
+        expected = torch.softmax(model(rgb_equivalent(pixels)), dim=1)
+
+    rgb_conv = model.conv1
+    try:
+        to_grayscale(model)
+        with torch.inference_mode():
+            difference = (torch.softmax(model(pixels), dim=1) - expected).abs().max().item()
+    except (ValueError, AttributeError) as e:
+        model.conv1 = rgb_conv
+        print(f"⚠ Could not build a grayscale {label} model ({e}), using RGB input")
+        return model
+
+    if difference > TOLERANCE:
+        model.conv1 = rgb_conv
+        print(f"⚠ Grayscale {label} model differs from RGB by {difference:.2e} (> {TOLERANCE:.0e}), using RGB input")
+        return model
+    print(f"✓ Using the single-channel grayscale {label} model (max probability diff {difference:.1e})")
+    return model
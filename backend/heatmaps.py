@@ -0,0 +1,170 @@
+"""
+HEATMAPS
+Self-contained heatmap ids and on-demand rendering of GradCAM maps
+
+A heatmap id is the raw low-resolution map itself (7x7 float16, base64url,
+about 140 characters), optionally followed by the content hash of the
+archived scan for overlays. Nothing has to be stored on the server: any
+worker, on any host, can render an id at any time, so heatmap URLs can be
+kept in patient records (the frontend resolves "/heatmaps/<id>" against
+its API base). Rendered images are cached in memory by
+(id, size, format, overlay).
+"""
+
+import base64
+import re
+import threading
+
+import cv2
+import numpy as np
+
+from caching import LRUCache
+from gradcam import encode_heatmap, render_cam, unpack_cam
+
+# format -> (extension, media type, encoder params)
+FORMATS = {
+    "webp": (".webp", "image/webp", (cv2.IMWRITE_WEBP_QUALITY, 85)),
+    "avif": (".avif", "image/avif", (cv2.IMWRITE_AVIF_QUALITY, 70)),
+    "png": (".png", "image/png", ()),
+    "jpeg": (".jpg", "image/jpeg", (cv2.IMWRITE_JPEG_QUALITY, 90)),
+}
+
+# Heatmap weight when blended over the scan
+OVERLAY_ALPHA = 0.4
+
+# Largest CAM side accepted in an id (layer4 maps are 7x7)
+MAX_CAM_SIZE = 64
+
+# <height>x<width>.<float16 values, base64url>[.<sha256 of the scan><ext>]
+HEATMAP_ID = re.compile(r"^(\d{1,2})x(\d{1,2})\.([A-Za-z0-9_-]+)(?:\.([0-9a-f]{64}(?:\.[a-z0-9]{1,5})?))?$")
+
+
+class HeatmapNotFound(Exception):
+    """Raised when an overlay's scan is not available on this server"""
+
+
+def heatmap_id(packed_cam, scan=None):
+    """
+    Id for a packed CAM (gradcam.pack_cam)
+
+    `scan` is the archived scan's path in the upload store ("ab/<sha><ext>"),
+    used for overlays.
+    """
+    cam = unpack_cam(packed_cam).astype(np.float16)
+    height, width = cam.shape
+    data = base64.urlsafe_b64encode(cam.tobytes()).decode("ascii").rstrip("=")
+    parts = [f"{height}x{width}", data]
+    if scan:
+        parts.append(scan.rsplit("/", 1)[-1])
+    return ".".join(parts)
+
+
+def parse_heatmap_id(value):
+    """
+    (cam, scan) back from a heatmap id; scan is the upload store path or None
+
+    Raises:
+        ValueError: malformed id
+    """
+    match = HEATMAP_ID.match(value or "")
+    if match is None:
+        raise ValueError("Malformed heatmap id")
+    height, width, data, scan = match.groups()
+    height, width = int(height), int(width)
+    if not (0 < height <= MAX_CAM_SIZE and 0 < width <= MAX_CAM_SIZE):
+        raise ValueError("Malformed heatmap id")
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    if len(raw) != height * width * 2:
+        raise ValueError("Malformed heatmap id")
+    cam = np.frombuffer(raw, dtype=np.float16).reshape(height, width).astype(np.float32)
+    if not np.isfinite(cam).all():
+        raise ValueError("Malformed heatmap id")
+    return cam, f"{scan[:2]}/{scan}" if scan else None
+
+
+class HeatmapRenderer:
+    """
+    Renders heatmap ids to images, with an LRU of the rendered results
+
+    /heatmaps/{id} is public and ids are cheap to make up, so the LRU is
+    bounded by total bytes as well as by entry count.
+
+    Overlays read the scan from `upload_store` (an UploadStore); scans that
+    aren't archived on this server raise HeatmapNotFound.
+    """
+
+    def __init__(self, upload_store=None, rendered_items=256, rendered_bytes=32 * 1024 * 1024, max_size=1024):
+        self.upload_store = upload_store
+        self.max_size = max_size
+        self._rendered = LRUCache(rendered_items, max_bytes=rendered_bytes)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def render(self, heatmap_id, size=224, fmt="webp", overlay=False):
+        """
+        Encoded heatmap image for `heatmap_id`
+
+        Without overlay the JET-coloured map is size x size; with overlay it
+        is blended over the archived scan, scaled so its longer side is `size`
+        (the CAM is stretched to the scan like the model's 224x224 input was).
+
+        Returns:
+            (bytes, media_type)
+
+        Raises:
+            HeatmapNotFound: no local copy of the scan for an overlay
+            ValueError: malformed id, unsupported size or format
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}', expected one of {list(FORMATS)}")
+        if not 16 <= size <= self.max_size:
+            raise ValueError(f"size must be between 16 and {self.max_size}")
+
+        # Parsed first so malformed ids never count as cache lookups
+        cam, scan = parse_heatmap_id(heatmap_id)
+        ext, media_type, params = FORMATS[fmt]
+        key = (heatmap_id, size, fmt, overlay)
+        image = self._rendered.get(key)
+        self._count("misses" if image is None else "hits")
+        if image is not None:
+            return image, media_type
+
+        if overlay:
+            scan = self._load_scan(scan, size)
+            heatmap = cv2.applyColorMap(np.uint8(255 * render_cam(cam, scan.shape[:2])), cv2.COLORMAP_JET)
+            blended = cv2.addWeighted(heatmap, OVERLAY_ALPHA, scan, 1 - OVERLAY_ALPHA, 0)
+            ok, buffer = cv2.imencode(ext, blended, list(params))
+            if not ok:
+                raise ValueError(f"Could not encode overlay as {fmt}")
+            image = buffer.tobytes()
+        else:
+            image = encode_heatmap(render_cam(cam, (size, size)), ext, params)
+
+        self._rendered.put(key, image)
+        return image, media_type
+
+    def _load_scan(self, scan, size):
+        # touch() also keeps the scan recent in the store's eviction order
+        available = scan and self.upload_store is not None and self.upload_store.touch(scan)
+        image = cv2.imread(self.upload_store.path(scan)) if available else None
+        if image is None:
+            raise HeatmapNotFound("The original scan is not stored on this server (enable ARCHIVE_UPLOADS for overlays)")
+        height, width = image.shape[:2]
+        scale = size / max(height, width)
+        return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "rendered_entries": len(self._rendered),
+            "rendered_bytes": self._rendered.nbytes,
+            "rendered_max_bytes": self._rendered.max_bytes,
+        }
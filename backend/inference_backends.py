@@ -0,0 +1,112 @@
+"""
+INFERENCE BACKENDS
+Chooses what runs label-only forward passes: the eager PyTorch model, an
+exported graph (TorchScript / ONNX Runtime) or a quantized variant
+"""
+
+import os
+
+import torch
+
+from quantize_models import load_quantized_model, variant_path
+from settings import INFERENCE_BACKEND, MODEL_PRECISION
+
+BACKENDS = ["eager", "torchscript", "onnxruntime"]
+
+# Max absolute logit difference accepted between an exported graph and eager
+EXPORT_TOLERANCE = 1e-3
+
+
+def exported_path(checkpoint_path, backend):
+    """xray_pneumonia_model.pth -> xray_pneumonia_model_torchscript.pt / xray_pneumonia_model.onnx"""
+    stem = os.path.splitext(checkpoint_path)[0]
+    if backend == "onnxruntime":
+        return f"{stem}.onnx"
+    return f"{stem}_{backend}.pt"
+
+
+class OnnxRuntimeModel:
+    """Callable wrapper so an ONNX Runtime session can stand in for the torch model"""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        outputs = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+
+def load_exported_model(checkpoint_path, backend):
+    """Load an exported graph for `backend`, or None if it hasn't been built"""
+    path = exported_path(checkpoint_path, backend)
+    if not os.path.exists(path):
+        return None
+    if backend == "onnxruntime":
+        return OnnxRuntimeModel(path)
+    model = torch.jit.load(path, map_location="cpu")
+    model.eval()
+    return model
+
+
+def max_logit_difference(reference, candidate, batch_size=2):
+    """Largest absolute difference between two models' logits on random inputs"""
+    generator = torch.Generator().manual_seed(0)
+    inputs = torch.randn(batch_size, 3, 224, 224, generator=generator)
+    with torch.inference_mode():
+        return (reference(inputs) - candidate(inputs)).abs().max().item()
+
+
+def is_stale(artifact_path, checkpoint_path):
+    """True if the artifact was built before the checkpoint was last written"""
+    try:
+        return os.path.getmtime(artifact_path) < os.path.getmtime(checkpoint_path)
+    except OSError:
+        return False
+
+
+def load_inference_model(model, checkpoint_path, label):
+    """
+    Model used for label-only (explain=false) predictions
+
+    MODEL_PRECISION selects a quantized variant first; otherwise
+    INFERENCE_BACKEND selects an exported graph, which is checked against
+    the eager model before use. Anything missing or mismatching falls back
+    to the eager model. GradCAM always runs on the eager model.
+    """
+    if MODEL_PRECISION != "fp32":
+        # Quantized outputs can't be compared exactly, so at least refuse a
+        # variant built from older weights than the checkpoint being served
+        if is_stale(variant_path(checkpoint_path, MODEL_PRECISION), checkpoint_path):
+            print(f"⚠ {MODEL_PRECISION} {label} model is older than {checkpoint_path} (re-run quantize_models.py), using fp32")
+        else:
+            quantized = load_quantized_model(checkpoint_path, MODEL_PRECISION)
+            if quantized is not None:
+                print(f"✓ Using {MODEL_PRECISION} {label} model for label-only predictions")
+                return quantized
+            print(f"⚠ No {MODEL_PRECISION} {label} model found (run quantize_models.py), using fp32")
+
+    if INFERENCE_BACKEND == "eager":
+        return model
+    if INFERENCE_BACKEND not in BACKENDS:
+        print(f"⚠ Unknown INFERENCE_BACKEND '{INFERENCE_BACKEND}', using eager")
+        return model
+
+    try:
+        exported = load_exported_model(checkpoint_path, INFERENCE_BACKEND)
+    except Exception as e:
+        print(f"⚠ Could not load {INFERENCE_BACKEND} {label} model: {e}")
+        exported = None
+    if exported is None:
+        print(f"⚠ No {INFERENCE_BACKEND} {label} model found (run export_models.py), using eager")
+        return model
+
+    difference = max_logit_difference(model, exported)
+    if difference > EXPORT_TOLERANCE:
+        print(f"⚠ {INFERENCE_BACKEND} {label} model differs from eager by {difference:.2e}, using eager")
+        return model
+
+    print(f"✓ Using {INFERENCE_BACKEND} {label} model (max diff {difference:.1e})")
+    return exported
@@ -1,20 +1,74 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
+from typing import List
 from fastapi.staticfiles import StaticFiles
-import shutil, os
-import numpy as np
-import io
-from PIL import Image
+import os
+import hmac
 
 
 # Import Prediction Modules
 from predict import predict_image  # X-ray (ResNet18)
 from predict_ecg import predict_ecg  # ECG (Vision ResNet18)
+import predict, predict_ecg as ecg_module
+import bulk
+
+# Models load lazily / in the background; importing them above is cheap
+from model_registry import registry, ModelUnavailable
+from settings import MODEL_LOADING, REQUIRED_MODELS, MODEL_WATCH_INTERVAL_SECONDS, ADMIN_TOKEN
+
+# Intra-op threads per worker, tuned against the loaded X-ray model
+import thread_tuning
 
 # Import Cloudinary configuration
-from cloudinary_config import upload_to_cloudinary, delete_from_cloudinary
+from cloudinary_config import upload_to_cloudinary
 from routes.cloudinary_upload import router as cloudinary_router
 
+# Bounded pool for blocking inference work
+from executor import InferenceExecutor, ExecutorBusy
+from settings import INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE
+
+# (bulk forward passes run here, with the tuned torch thread count)
+inference_executor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, prepare=thread_tuning.apply)
+
+from settings import ARCHIVE_UPLOADS, UPLOAD_FOLDER, UPLOAD_STORE_MB, UPLOAD_TTL_SECONDS
+from upload_store import UploadStore
+
+# Background Cloudinary uploads, with their status shared between workers
+from upload_manager import UploadManager
+from prediction_cache import PredictionCache
+from settings import UPLOAD_WORKERS, UPLOAD_JOBS_KEPT, UPLOAD_STATUS_DIR, UPLOAD_STATUS_TTL_SECONDS
+
+# (read straight from disk, since other workers keep updating their jobs)
+upload_status_cache = PredictionCache(
+    UPLOAD_STATUS_DIR,
+    memory_items=1,
+    disk_max_bytes=16 * 1024 * 1024,
+    ttl_seconds=UPLOAD_STATUS_TTL_SECONDS,
+)
+upload_manager = UploadManager(upload_to_cloudinary, UPLOAD_WORKERS, UPLOAD_JOBS_KEPT, upload_status_cache)
+
+# Per-stage Prometheus metrics
+import metrics
+from metrics import CACHE_LOOKUPS, MetricsMiddleware, stage
+
+# Opt-in per-request profiles (admin only)
+import profiling
+
+# Content-addressed cache of finished results
+from settings import (
+    PREDICTION_CACHE_DIR, PREDICTION_CACHE_MEMORY_ITEMS,
+    PREDICTION_CACHE_DISK_MB, PREDICTION_CACHE_TTL_SECONDS,
+)
+
+prediction_cache = PredictionCache(
+    PREDICTION_CACHE_DIR,
+    memory_items=PREDICTION_CACHE_MEMORY_ITEMS,
+    disk_max_bytes=PREDICTION_CACHE_DISK_MB * 1024 * 1024,
+    ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+)
+
 app = FastAPI()
 
 # ✅ include router AFTER app is created
@@ -29,53 +83,243 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ---- Upload Folder ----
-UPLOAD_FOLDER = "uploaded_images"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Request latency by route for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# ---- Upload Folder (content-addressed, size-capped) ----
+upload_store = UploadStore(UPLOAD_FOLDER, max_bytes=UPLOAD_STORE_MB * 1024 * 1024, ttl_seconds=UPLOAD_TTL_SECONDS)
+
+# ---- Heatmaps (self-contained ids, rendered on demand) ----
+from heatmaps import HeatmapNotFound, HeatmapRenderer, heatmap_id
+from settings import HEATMAP_RENDER_CACHE_ITEMS, HEATMAP_RENDER_CACHE_MB, HEATMAP_MAX_SIZE
+
+heatmap_renderer = HeatmapRenderer(
+    upload_store,
+    rendered_items=HEATMAP_RENDER_CACHE_ITEMS,
+    rendered_bytes=HEATMAP_RENDER_CACHE_MB * 1024 * 1024,
+    max_size=HEATMAP_MAX_SIZE,
+)
 
 # ---- Serve Static Files (Locally) ----
 app.mount("/uploaded_images", StaticFiles(directory=UPLOAD_FOLDER), name="uploaded_images")
 
+# ---- Model Loading ----
+@app.on_event("startup")
+def load_models():
+    def xray_model():
+        return registry.get("xray").model
+
+    if MODEL_LOADING == "background":
+        registry.load_in_background()
+        thread_tuning.configure_in_background(xray_model)
+    elif MODEL_LOADING == "eager":
+        for name in registry.names():
+            registry.load(name)
+        thread_tuning.configure(xray_model)
+    else:
+        # Lazy loading: nothing to benchmark yet
+        thread_tuning.configure(None)
+
+    # Pick up retrained checkpoints without a restart
+    if MODEL_WATCH_INTERVAL_SECONDS > 0:
+        registry.watch(MODEL_WATCH_INTERVAL_SECONDS)
+
+# ---- Readiness (route traffic only to warm workers) ----
+@app.get("/ready")
+def readiness():
+    ready = registry.is_ready(REQUIRED_MODELS) and thread_tuning.is_done()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "required": REQUIRED_MODELS, "models": registry.status(), "threads": thread_tuning.status()},
+    )
+
+# ---- Admin ----
+def require_admin(token):
+    if not ADMIN_TOKEN or not hmac.compare_digest(token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def wants_profile(profile, x_profile, x_admin_token):
+    """True if an admin asked to profile this request (?profile=true or X-Profile: 1)"""
+    if not (profile or (x_profile or "").strip().lower() in ("1", "true", "yes")):
+        return False
+    require_admin(x_admin_token)
+    return True
+
+# ---- Hot Reload of Model Weights ----
+@app.post("/admin/models/{name}/reload")
+async def reload_model(name: str, x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    if name not in registry.names():
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'")
+
+    # Loads and warms the new weights on a worker thread while the current
+    # model keeps serving requests
+    reloaded = await run_in_threadpool(registry.reload, name)
+    return JSONResponse(
+        status_code=200 if reloaded else 500,
+        content={"reloaded": reloaded, "model": registry.status()[name]},
+    )
+
+# ---- Saved Request Profiles ----
+@app.get("/admin/profiles/{profile_id}/{artifact}")
+def profile_artifact(profile_id: str, artifact: str, x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    path = profiling.artifact_path(profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile or artifact, expected one of {list(profiling.ARTIFACTS)}")
+    return FileResponse(path, filename=os.path.basename(path))
+
 # ---- Root Endpoint ----
 @app.get("/")
 def home():
     return {"message": "Integrated Healthcare System AI Backend Running"}
 
+# ---- Micro-batching Statistics ----
+@app.get("/stats/batching")
+def batching_stats():
+    return {
+        "xray": predict.batcher.stats(),
+        "ecg": ecg_module.batcher.stats(),
+        "executor": inference_executor.stats(),
+        "uploads": upload_manager.stats(),
+    }
+
+# ---- Prometheus Metrics ----
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# ---- Prediction Cache Statistics ----
+@app.get("/stats/cache")
+def cache_stats():
+    return prediction_cache.stats()
+
+# ---- Background Upload Status ----
+@app.get("/uploads/{upload_id}")
+def upload_status(upload_id: str):
+    status = upload_manager.status(upload_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown upload id")
+    return status
+
+def start_uploads(result, uploads, cache_key=None):
+    """
+    Upload files in the background and point the result at the status URL
+
+    Once every upload succeeded the result, completed with its Cloudinary
+    URLs, is stored in the prediction cache under `cache_key`.
+    """
+    def on_complete(status):
+        if cache_key is None or status["status"] != "complete":
+            return
+        completed = {k: v for k, v in result.items() if k not in ("upload_id", "upload_status_url", "profile_id")}
+        for key in ("file_url", "cloudinary_public_id"):
+            if key in status:
+                completed[key] = status[key]
+        prediction_cache.put(cache_key, completed)
+
+    upload_id = upload_manager.submit(uploads, on_complete)
+    result["upload_id"] = upload_id
+    result["upload_status_url"] = f"/uploads/{upload_id}"
+    return result
+
+def archive_upload(filename, data):
+    """
+    Debug/archive mode: keep a local copy of the upload (also enables heatmap overlays)
+
+    Returns:
+        path relative to the /uploaded_images mount
+    """
+    return upload_store.put(data, filename)
+
+def store_heatmap(response_data, scan=None):
+    """
+    Replace the raw CAM ("heatmap_cam") with heatmap_id / heatmap_url
+
+    The id carries the map itself, so the URL never expires and any worker
+    can serve it. It is relative to the API base (the frontend resolves it),
+    so it stays valid in saved records if the API moves. `scan` is the
+    archived upload's relative path, for overlays.
+    """
+    heatmap_cam = response_data.pop("heatmap_cam", None)
+    if heatmap_cam is None:
+        return response_data
+    response_data["heatmap_id"] = heatmap_id(heatmap_cam, scan)
+    response_data["heatmap_url"] = f"/heatmaps/{response_data['heatmap_id']}"
+    return response_data
+
+async def served_version(model):
+    """
+    Version of the weights that will serve this request, loading them first
+
+    Resolved from the loaded model (MODEL_VERSION+sha256 of the checkpoint),
+    so cache keys change with retrained weights even right after a restart.
+    None if the model can't be loaded; such requests skip the cache.
+    """
+    try:
+        return (await run_in_threadpool(registry.get, model)).version
+    except ModelUnavailable:
+        return None
+
+async def lookup_cached(model, cache_key):
+    with stage(model, "cache_lookup"):
+        cached = await run_in_threadpool(prediction_cache.get, cache_key)
+    CACHE_LOOKUPS.labels(model, "miss" if cached is None else "hit").inc()
+    return cached
+
+async def run_inference(fn, *args):
+    try:
+        return await inference_executor.run(fn, *args)
+    except (ExecutorBusy, ModelUnavailable) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 # ---- X-RAY PREDICTION ENDPOINT ----
 @app.post("/predict")
-async def predict_xray_endpoint(file: UploadFile = File(...), symptoms: str = Form(None)):
+async def predict_xray_endpoint(
+    request: Request, file: UploadFile = File(...), symptoms: str = Form(None), explain: bool = True,
+    profile: bool = False, x_profile: str = Header(None), x_admin_token: str = Header(None),
+):
+    profiling_request = wants_profile(profile, x_profile, x_admin_token)
     try:
-        # Save file locally
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with stage("xray", "read"):
+            data = await file.read()
 
-        # Run AI prediction
+        # Same scan + symptoms already analysed? A cached full result also
+        # satisfies explain=false requests.
+        version = await served_version("xray")
+        cache_key = PredictionCache.make_key(data, version, symptoms) if version else None
+        cached = None if profiling_request or cache_key is None else await lookup_cached("xray", cache_key)
+        if cached is not None:
+            print(f"Cache hit for X-ray: {file.filename}")
+            return cached
+
+        # Run AI prediction straight from the request bytes
         print(f"Analyzing X-ray: {file.filename}")
-        result = predict_image(file_path, symptoms)
+        if profiling_request:
+            result, profile_id = await run_inference(profiling.run, "xray", predict_image, data, symptoms, explain)
+            result["profile_id"] = profile_id
+        else:
+            result = await run_inference(predict_image, data, symptoms, explain)
         
-        # Upload X-ray image to Cloudinary
-        print("Uploading X-ray to Cloudinary...")
-        xray_upload = upload_to_cloudinary(file_path, folder="healthcare/xrays")
+        relative_path = None
+        if ARCHIVE_UPLOADS:
+            with stage("xray", "archive"):
+                relative_path = await run_in_threadpool(archive_upload, file.filename, data)
+            result["file_url"] = str(request.url_for("uploaded_images", path=relative_path))
+
+        store_heatmap(result, relative_path)
         
-        if not xray_upload.get("success"):
-            print(f"Cloudinary upload failed: {xray_upload.get('error')}")
-            # Continue with local URL in worst case (though frontend expects Cloudinary)
-        else:
-            result["file_url"] = xray_upload["url"]
-            result["cloudinary_public_id"] = xray_upload["public_id"]
+        # Upload the X-ray in the background; the client polls
+        # upload_status_url for file_url
+        uploads = {"file": (data, "healthcare/xrays", file.filename)}
         
-        # Upload heatmap to Cloudinary if it exists
-        if result.get("heatmap_path"):
-            heatmap_local_path = result["heatmap_path"]
-            if os.path.exists(heatmap_local_path):
-                print("Uploading Heatmap to Cloudinary...")
-                heatmap_upload = upload_to_cloudinary(heatmap_local_path, folder="healthcare/heatmaps")
-                if heatmap_upload.get("success"):
-                    result["heatmap_url"] = heatmap_upload["url"]
+        # Only cache complete results (explained and stored in Cloudinary)
+        start_uploads(result, uploads, cache_key if explain else None)
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -83,42 +327,51 @@ async def predict_xray_endpoint(file: UploadFile = File(...), symptoms: str = Fo
 
 # ---- ECG PREDICTION ENDPOINT (VISION BASED) ----
 @app.post("/predict_ecg")
-async def predict_ecg_endpoint(file: UploadFile = File(...)):
+async def predict_ecg_endpoint(
+    request: Request, file: UploadFile = File(...), explain: bool = True,
+    profile: bool = False, x_profile: str = Header(None), x_admin_token: str = Header(None),
+):
+    profiling_request = wants_profile(profile, x_profile, x_admin_token)
     try:
-        # Save file locally
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with stage("ecg", "read"):
+            data = await file.read()
 
-        # Run AI prediction
+        version = await served_version("ecg")
+        cache_key = PredictionCache.make_key(data, version) if version else None
+        cached = None if profiling_request or cache_key is None else await lookup_cached("ecg", cache_key)
+        if cached is not None:
+            print(f"Cache hit for ECG: {file.filename}")
+            return cached
+
+        # Run AI prediction straight from the request bytes
         print(f"Analyzing ECG: {file.filename}")
-        result = predict_ecg(file_path)
+        if profiling_request:
+            result, profile_id = await run_inference(profiling.run, "ecg", predict_ecg, data, explain)
+            result["profile_id"] = profile_id
+        else:
+            result = await run_inference(predict_ecg, data, explain)
         
         if "error" in result:
              # If model not ready, proceed with upload but return error in result or mock?
              # For now, let's allow it to return so we can see the UI at least
              pass
 
-        # Upload ECG image to Cloudinary
-        print("Uploading ECG to Cloudinary...")
-        ecg_upload = upload_to_cloudinary(file_path, folder="healthcare/ecgs")
-        
+        local_url = None
+        relative_path = None
+        if ARCHIVE_UPLOADS:
+            with stage("ecg", "archive"):
+                relative_path = await run_in_threadpool(archive_upload, file.filename, data)
+            local_url = str(request.url_for("uploaded_images", path=relative_path))
+
         response_data = result.copy()
+        response_data["file_url"] = local_url
+        store_heatmap(response_data, relative_path)
         
-        if ecg_upload.get("success"):
-            response_data["file_url"] = ecg_upload["url"]
-            response_data["cloudinary_public_id"] = ecg_upload["public_id"]
-        else:
-            response_data["file_url"] = f"http://localhost:8000/uploaded_images/{file.filename}"
-            
-        # Upload heatmap if available
-        if result.get("heatmap_path"):
-            heatmap_local_path = result["heatmap_path"]
-            if os.path.exists(heatmap_local_path):
-                print("Uploading ECG Heatmap to Cloudinary...")
-                heatmap_upload = upload_to_cloudinary(heatmap_local_path, folder="healthcare/ecg_heatmaps")
-                if heatmap_upload.get("success"):
-                    response_data["heatmap_url"] = heatmap_upload["url"]
+        # Upload ECG image in the background
+        uploads = {"file": (data, "healthcare/ecgs", file.filename)}
+        
+        cacheable = explain and "error" not in result
+        start_uploads(response_data, uploads, cache_key if cacheable else None)
         
         # Structure match frontend expectations
         # Frontend expects: ecgPrediction.ECG_Prediction_Label, confidence, etc.
@@ -127,11 +380,66 @@ async def predict_ecg_endpoint(file: UploadFile = File(...)):
         
         return response_data
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+# ---- BULK PREDICTION (many files or zip archives, NDJSON stream) ----
+@app.post("/predict/bulk")
+async def predict_bulk_endpoint(files: List[UploadFile] = File(...), model: str = "xray"):
+    if model not in bulk.MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model '{model}', expected one of {list(bulk.MODELS)}")
+
+    # Fail fast (503) if the model can't be loaded, before streaming starts
+    try:
+        await run_in_threadpool(registry.get, model)
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    print(f"Bulk {model} prediction: {len(files)} upload(s)")
+    return StreamingResponse(bulk.stream_predictions(model, files, run_inference), media_type="application/x-ndjson")
+
+# ---- ON-DEMAND HEATMAPS (for explain=false predictions) ----
+async def explain_later(explain_prediction, prediction_id):
+    heatmap_cam = await run_inference(explain_prediction, prediction_id)
+    if heatmap_cam is None:
+        raise HTTPException(status_code=404, detail="Prediction not found or expired. Please run the analysis again.")
+
+    response_data = {"prediction_id": prediction_id, "heatmap_path": None, "heatmap_cam": heatmap_cam}
+    return store_heatmap(response_data)
+
+@app.get("/predict/{prediction_id}/heatmap")
+async def xray_heatmap_endpoint(prediction_id: str):
+    return await explain_later(predict.explain_prediction, prediction_id)
+
+@app.get("/predict_ecg/{prediction_id}/heatmap")
+async def ecg_heatmap_endpoint(prediction_id: str):
+    return await explain_later(ecg_module.explain_prediction, prediction_id)
+
+# ---- HEATMAP IMAGES (rendered from the CAM in the id, cached) ----
+@app.get("/heatmaps/{heatmap_id}", name="heatmap_image")
+async def heatmap_image(heatmap_id: str, size: int = 224, format: str = "webp", overlay: bool = False):
+    try:
+        with stage("heatmap", "render"):
+            image, media_type = await run_in_threadpool(heatmap_renderer.render, heatmap_id, size, format.lower(), overlay)
+    except HeatmapNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Ids are the map itself, so a rendering never changes
+    return Response(image, media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/stats/heatmaps")
+def heatmap_stats():
+    return heatmap_renderer.stats()
+
+@app.get("/stats/uploads")
+def upload_store_stats():
+    return upload_store.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,258 @@
+"""
+METRICS
+Low-overhead counters and histograms for every stage of the prediction
+pipeline, exposed in the Prometheus text format on /metrics
+
+Recording a value is a dict lookup, a bisect and a few additions under a
+per-series lock, so instrumenting the hot path costs microseconds. Series
+live in process memory: with several uvicorn workers each scrape is
+answered by one worker, so run one worker per port (or per pod) when exact
+totals matter.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from sub-millisecond stages up to slow uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+        if not self.labelnames:
+            self.labels()  # export 0 from the start
+
+    def labels(self, *values):
+        """The series for these label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}_total{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonic count, exported as <name>_total"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, [("le", _format_value(float(bound)))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution over fixed buckets, exported as _bucket/_sum/_count"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ============================================================
+# PIPELINE METRICS
+# ============================================================
+
+REQUEST_SECONDS = Histogram(
+    "mediexpert_request_duration_seconds",
+    "HTTP request latency by route template and status code",
+    ("method", "route", "status"),
+)
+
+# Stages emitted per model label:
+#   xray / ecg: read, cache_lookup, decode, validate (xray), normalize,
+#               forward, gradcam, archive
+#   heatmap:    render (heatmap images are encoded on demand, on /heatmaps)
+STAGE_SECONDS = Histogram(
+    "mediexpert_stage_duration_seconds",
+    "Time spent in one pipeline stage (read, cache_lookup, decode, validate, normalize, "
+    "forward, gradcam, archive; render for model=heatmap)",
+    ("model", "stage"),
+)
+
+BATCH_QUEUE_WAIT_SECONDS = Histogram(
+    "mediexpert_batch_queue_wait_seconds",
+    "Time a request waited in the micro-batcher before its batch started",
+    ("model",),
+)
+
+BATCH_SIZE = Histogram(
+    "mediexpert_batch_size",
+    "Requests per batched forward pass",
+    ("model",),
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+EXECUTOR_QUEUE_WAIT_SECONDS = Histogram(
+    "mediexpert_executor_queue_wait_seconds",
+    "Time a blocking inference call waited for a free worker thread",
+)
+
+EXECUTOR_REJECTIONS = Counter(
+    "mediexpert_executor_rejections",
+    "Inference calls rejected because the executor queue was full",
+)
+
+CACHE_LOOKUPS = Counter(
+    "mediexpert_prediction_cache_lookups",
+    "Prediction cache lookups by model and result (hit or miss)",
+    ("model", "result"),
+)
+
+UPLOAD_SECONDS = Histogram(
+    "mediexpert_upload_duration_seconds",
+    "Cloudinary upload time by file kind (file, heatmap) and result (success or failure)",
+    ("kind", "result"),
+)
+
+UPLOAD_FAILURES = Counter(
+    "mediexpert_upload_failures",
+    "Cloudinary uploads that failed, by file kind",
+    ("kind",),
+)
+
+
+def stage(model, name):
+    """Context manager timing one stage: `with stage("xray", "decode"): ...`"""
+    return STAGE_SECONDS.labels(model, name).time()
+
+# ============================================================
+# ASGI MIDDLEWARE
+# ============================================================
+
+class MetricsMiddleware:
+    """
+    Records REQUEST_SECONDS for every HTTP request
+
+    Plain ASGI (not BaseHTTPMiddleware) so it adds no extra task per request
+    and times streamed responses until their last chunk is sent. Requests
+    are labelled with the matched route template ("/uploads/{upload_id}")
+    rather than the raw path, which keeps the number of series bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], path, str(status[0])).observe(time.perf_counter() - start)
@@ -0,0 +1,305 @@
+"""
+MODEL REGISTRY
+Loads the X-ray and ECG models lazily or in the background, warms them up
+and reports per-model state for the readiness endpoint
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+
+import torch
+
+from grayscale_model import is_grayscale
+from preprocessing import example_batch
+from settings import MODEL_WARMUP, SHARED_WEIGHTS
+
+
+class ModelUnavailable(Exception):
+    """Raised when a model could not be loaded (e.g. its checkpoint is missing)"""
+
+
+class LoadedModel:
+    """
+    Everything one prediction module serves from
+
+    model:        eager PyTorch model (GradCAM runs on it)
+    infer_model:  what label-only predictions run on (eager, exported or quantized)
+    gradcam:      GradCAM capture registered on `model`
+    version:      model version string returned with results
+    """
+
+    def __init__(self, model, infer_model, gradcam, version):
+        self.model = model
+        self.infer_model = infer_model
+        self.gradcam = gradcam
+        self.version = version
+
+
+def load_checkpoint(build_model, checkpoint_path, base_version):
+    """
+    Build a model with `build_model()` and load its trained weights
+
+    With SHARED_WEIGHTS the checkpoint is memory-mapped and the parameters
+    point straight into the mapping (the model is built on the meta device,
+    so no throwaway random weights are allocated). Every worker process that
+    maps the same file shares those read-only pages through the OS page
+    cache. Otherwise the file is read into private memory. Parameters are
+    frozen either way: inference never needs their gradients.
+
+    Returns:
+        (model, version) where version changes whenever the weights do
+    """
+    if SHARED_WEIGHTS:
+        with open(checkpoint_path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        with torch.device("meta"):
+            model = build_model()
+        state_dict = torch.load(checkpoint_path, map_location="cpu", mmap=True, weights_only=True)
+        model.load_state_dict(state_dict, assign=True)
+    else:
+        # Read once, so the version hash describes exactly the weights loaded
+        with open(checkpoint_path, "rb") as f:
+            checkpoint = f.read()
+        digest = hashlib.sha256(checkpoint).hexdigest()
+        model = build_model()
+        model.load_state_dict(torch.load(io.BytesIO(checkpoint), map_location="cpu", weights_only=True))
+
+    model.eval()
+    model.requires_grad_(False)
+    return model, f"{base_version}+{digest[:10]}"
+
+
+def save_checkpoint_atomic(state_dict, checkpoint_path):
+    """
+    Save trained weights for load_checkpoint
+
+    Written to a temporary file and renamed into place, so a server
+    hot-reloading the checkpoint never reads a half-written file.
+    """
+    tmp_path = f"{checkpoint_path}.{os.getpid()}.tmp"
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def zero_batch(model, batch_size):
+    """All-zero batch in `model`'s input format"""
+    return torch.zeros_like(example_batch(batch_size, is_grayscale(model)))
+
+
+def warmup(loaded, batch_size=1):
+    """Run the label-only and GradCAM paths once so the first request isn't slow"""
+    batch = zero_batch(loaded.model, batch_size)
+    with torch.inference_mode():
+        loaded.infer_model(batch)
+
+    with loaded.gradcam.capture() as captured:
+        output = loaded.model(batch)
+    loaded.gradcam.compute(captured, output, output.argmax(dim=1))
+
+
+def validate(loaded, previous=None):
+    """Reject a freshly loaded model that produces broken or mismatching outputs"""
+    batch = zero_batch(loaded.model, 2)
+    with torch.inference_mode():
+        output = loaded.model(batch)
+        fast_output = loaded.infer_model(batch)
+        if not torch.isfinite(output).all() or not torch.isfinite(fast_output).all():
+            raise ValueError("model produces non-finite outputs")
+        if fast_output.shape != output.shape:
+            raise ValueError(f"inference graph output {tuple(fast_output.shape)} != model output {tuple(output.shape)}")
+        if previous is not None:
+            expected = previous.model(zero_batch(previous.model, 2)).shape
+            if output.shape != expected:
+                raise ValueError(f"output shape {tuple(output.shape)} != current model's {tuple(expected)}")
+
+
+class _Entry:
+    def __init__(self, loader, checkpoint_path=None):
+        self.loader = loader
+        self.checkpoint_path = checkpoint_path
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.value = None
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.last_reload_error = None
+
+
+class ModelRegistry:
+    """
+    Named models, each built by a loader function on first use
+
+    `get()` loads a model on demand (lazy) and `load_in_background()` starts
+    loading every model at startup instead. Each model is loaded once; a
+    failure is remembered, so requests don't retry a missing checkpoint on
+    every call.
+
+    `reload()` swaps in new weights without downtime: the replacement is
+    loaded, warmed up and validated while the current model keeps serving,
+    then published with a single reference assignment. Batches that already
+    fetched the old LoadedModel finish on it.
+    """
+
+    def __init__(self, warmup_models=True):
+        self.warmup_models = warmup_models
+        self._entries = {}
+
+    def register(self, name, loader, checkpoint_path=None):
+        """
+        `loader()` builds and returns a LoadedModel (and raises if it can't).
+        `checkpoint_path` is the file watch() checks for new weights.
+        """
+        self._entries[name] = _Entry(loader, checkpoint_path)
+
+    def names(self):
+        return list(self._entries)
+
+    def load(self, name):
+        """Load `name` now if it isn't already; blocks while another thread loads it"""
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.state in ("ready", "failed"):
+                return
+            entry.state = "loading"
+
+            start = time.perf_counter()
+            try:
+                loaded = entry.loader()
+            except Exception as e:
+                entry.state = "failed"
+                entry.error = str(e)
+                entry.load_seconds = round(time.perf_counter() - start, 3)
+                print(f"⚠ Could not load {name} model: {e}")
+                return
+            entry.load_seconds = round(time.perf_counter() - start, 3)
+
+            if self.warmup_models:
+                entry.state = "warming_up"
+                start = time.perf_counter()
+                try:
+                    warmup(loaded)
+                except Exception as e:
+                    print(f"⚠ Warmup of {name} model failed: {e}")
+                entry.warmup_seconds = round(time.perf_counter() - start, 3)
+
+            entry.value = loaded
+            entry.loaded_at = time.time()
+            entry.state = "ready"
+            print(f"✓ {name} model ready (load {entry.load_seconds}s, warmup {entry.warmup_seconds}s)")
+
+    def get(self, name):
+        """The LoadedModel for `name`, loading it first if needed"""
+        entry = self._entries[name]
+        if entry.value is None:
+            self.load(name)
+            if entry.value is None:
+                raise ModelUnavailable(f"{name} model is not available: {entry.error}")
+        return entry.value
+
+    # ---- Hot reload ----
+
+    def reload(self, name):
+        """
+        Load, warm up and validate fresh weights for `name`, then swap them in
+
+        Returns True on success. On failure the current model keeps serving
+        and the error is reported in status().
+        """
+        entry = self._entries[name]
+        with entry.reload_lock:
+            start = time.perf_counter()
+            try:
+                loaded = entry.loader()
+                load_seconds = round(time.perf_counter() - start, 3)
+                warmup_start = time.perf_counter()
+                if self.warmup_models:
+                    warmup(loaded)
+                validate(loaded, entry.value)
+                warmup_seconds = round(time.perf_counter() - warmup_start, 3)
+            except Exception as e:
+                entry.last_reload_error = str(e)
+                print(f"⚠ Reload of {name} model failed, keeping the current one: {e}")
+                return False
+
+            with entry.lock:
+                previous = entry.value
+                # Atomic swap: new batches pick this up, running ones keep `previous`
+                entry.value = loaded
+                entry.state = "ready"
+                entry.error = None
+                entry.last_reload_error = None
+                entry.load_seconds = load_seconds
+                entry.warmup_seconds = warmup_seconds
+                entry.loaded_at = time.time()
+                entry.reloads += 1
+
+        old_version = previous.version if previous is not None else None
+        print(f"✓ {name} model reloaded: {old_version} -> {loaded.version}")
+        return True
+
+    def watch(self, interval_seconds):
+        """Reload models whose checkpoint file changed, polling every `interval_seconds`"""
+        threading.Thread(target=self._watch, args=(interval_seconds,), name="model-watcher", daemon=True).start()
+
+    def _watch(self, interval_seconds):
+        def signature(path):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            return stat.st_mtime, stat.st_size
+
+        watched = {name: entry for name, entry in self._entries.items() if entry.checkpoint_path}
+        seen = {name: signature(entry.checkpoint_path) for name, entry in watched.items()}
+        pending = {}
+
+        while True:
+            time.sleep(interval_seconds)
+            for name, entry in watched.items():
+                current = signature(entry.checkpoint_path)
+                if current is None or current == seen[name]:
+                    pending.pop(name, None)
+                    continue
+                # Only reload once the file stopped changing, so a checkpoint
+                # that is still being written is never picked up
+                if pending.get(name) != current:
+                    pending[name] = current
+                    continue
+                pending.pop(name)
+                seen[name] = current
+                print(f"Checkpoint {entry.checkpoint_path} changed, reloading {name} model")
+                self.reload(name)
+
+    def load_in_background(self, names=None):
+        """Start loading models in daemon threads; returns immediately"""
+        for name in names or self.names():
+            threading.Thread(target=self.load, args=(name,), name=f"load-{name}", daemon=True).start()
+
+    def is_ready(self, names=None):
+        names = names or self.names()
+        return all(name in self._entries and self._entries[name].state == "ready" for name in names)
+
+    def status(self):
+        return {
+            name: {
+                "state": entry.state,
+                "version": entry.value.version if entry.value is not None else None,
+                "load_seconds": entry.load_seconds,
+                "warmup_seconds": entry.warmup_seconds,
+                "loaded_at": entry.loaded_at,
+                "error": entry.error,
+                "reloads": entry.reloads,
+                "last_reload_error": entry.last_reload_error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+registry = ModelRegistry(MODEL_WARMUP)
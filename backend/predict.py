@@ -3,56 +3,129 @@ ENHANCED X-RAY PREDICTION SYSTEM
 Uses ResNet18 transfer learning model for high accuracy pneumonia detection
 """
 
-import torch
-import torch.nn as nn
-from torchvision import transforms, models
-from PIL import Image, ImageStat
-import numpy as np
-import cv2
 import os
 
+import torch
+
+import thread_tuning
+from batching import MicroBatcher
+from gradcam import GradCAM, pack_cam
+from prediction_cache import ExplainCache
+from preprocessing import preprocess
+from symptom_risk import score as score_symptoms
+from metrics import stage
+from architectures import build_xray_model
+from inference_backends import load_inference_model
+from cpu_modes import apply_cpu_mode
+from grayscale_model import apply_grayscale, is_grayscale
+from model_registry import LoadedModel, load_checkpoint, registry
+from settings import (
+    MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS, BATCH_WORKERS, XRAY_GRAYSCALE,
+    EXPLAIN_CACHE_SIZE, EXPLAIN_CACHE_DIR, EXPLAIN_CACHE_DISK_MB, EXPLAIN_CACHE_TTL_SECONDS,
+)
+
 # ============================================================
 # LOAD RESNET18 MODEL
 # ============================================================
 
 device = torch.device("cpu")
 
-# Load pre-trained ResNet18 and modify for our task
-model = models.resnet18(pretrained=False)
-num_features = model.fc.in_features
-model.fc = nn.Sequential(
-    nn.Dropout(0.5),
-    nn.Linear(num_features, 256),
-    nn.ReLU(),
-    nn.Dropout(0.3),
-    nn.Linear(256, 2)
-)
+MODEL_PATH = "xray_pneumonia_model.pth"
+MODEL_VERSION = "ResNet18_TransferLearning_v1.0"
+
+def load_model():
+    """Build the X-ray model, its label-only inference graph and GradCAM"""
+    # ResNet18 with our classification head, plus the trained weights
+    model, version = load_checkpoint(build_xray_model, MODEL_PATH, MODEL_VERSION)
+    model.to(device)
 
-# Load trained weights
-model.load_state_dict(torch.load("xray_pneumonia_model.pth", map_location=device))
-model.eval()
-model.to(device)
+    print("✓ ResNet18 model loaded successfully!")
 
-print("✓ ResNet18 model loaded successfully!")
+    # Optional single-channel variant fed straight from 8-bit grey
+    if XRAY_GRAYSCALE:
+        apply_grayscale(model, "X-ray")
+
+    # Label-only predictions can run on a quantized or exported graph
+    # (GradCAM needs the eager model's autograd). Those are built for RGB
+    # input, so the grayscale model serves both paths.
+    if is_grayscale(model):
+        infer_model = model
+    else:
+        infer_model = load_inference_model(model, MODEL_PATH, "X-ray")
+
+    # Captures layer4 (last conv layer in ResNet) per request, so concurrent
+    # explanations don't share state
+    gradcam = GradCAM(model.layer4[1].conv2)
+
+    # Optional channels-last / bf16 autocast (GradCAM's hook stays on the inner layer)
+    model, infer_model = apply_cpu_mode(model, infer_model, "X-ray")
+
+    return LoadedModel(model, infer_model, gradcam, version)
+
+# Loaded on first use, or in the background at server startup
+registry.register("xray", load_model, MODEL_PATH)
 
 # ============================================================
-# GRADCAM FOR VISUALIZATION
+# BATCHED INFERENCE
 # ============================================================
 
-gradients = None
-activations = None
-
-def backward_hook(module, grad_in, grad_out):
-    global gradients
-    gradients = grad_out[0]
+def run_batch(requests):
+    """
+    Forward pass over a batch of preprocessed images, plus GradCAM for the
+    ones that asked for an explanation
+    
+    Args:
+        requests: List of (input_tensor, explain) with (3, 224, 224) tensors,
+                  or (1, 224, 224) uint8 ones for the grayscale model
+        
+    Returns:
+        list: (probabilities, prediction_idx, cam, model_version) per
+              request, in order. cam is None when explain was False.
+    """
+    loaded = registry.get("xray")
+    results = [None] * len(requests)
+    fast_idx = [i for i, (_, explain) in enumerate(requests) if not explain]
+    explain_idx = [i for i, (_, explain) in enumerate(requests) if explain]
+    
+    if fast_idx:
+        # Label only: no autograd graph and no backward pass
+        with torch.inference_mode(), stage("xray", "forward"):
+            batch = torch.stack([requests[i][0] for i in fast_idx]).to(device)
+            probabilities = torch.softmax(loaded.infer_model(batch), dim=1)
+        for row, i in enumerate(fast_idx):
+            results[i] = (probabilities[row], probabilities[row].argmax().item(), None, loaded.version)
+    
+    if explain_idx:
+        batch = torch.stack([requests[i][0] for i in explain_idx]).to(device)
+        
+        # IMPORTANT: We need gradients for GradCAM even in validation mode
+        # Remove torch.no_grad() but keep model in eval mode
+        with loaded.gradcam.capture() as captured, stage("xray", "forward"):
+            output = loaded.model(batch)
+        probabilities = torch.softmax(output, dim=1).detach()
+        prediction_idx = torch.argmax(output, dim=1)
+        
+        # Backward to the target layer + CAM maps
+        with stage("xray", "gradcam"):
+            # Kept at layer4 resolution (7x7); rendered to images on demand
+            cams = loaded.gradcam.compute(captured, output, prediction_idx, size=None)
+        
+        for row, i in enumerate(explain_idx):
+            results[i] = (probabilities[row], prediction_idx[row].item(), cams[row], loaded.version)
+    
+    return results
 
-def forward_hook(module, input, output):
-    global activations
-    activations = output
+# Batches use the tuned torch thread count (set after these threads may have started)
+batcher = MicroBatcher("xray", run_batch, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS, BATCH_WORKERS, prepare=thread_tuning.apply)
 
-# Register hooks on layer4 (last conv layer in ResNet)
-model.layer4[1].conv2.register_forward_hook(forward_hook)
-model.layer4[1].conv2.register_full_backward_hook(backward_hook)
+# Uploads of explain=False predictions, kept for on-demand heatmaps (on
+# disk too, so the heatmap request can land on any worker)
+explain_cache = ExplainCache(
+    os.path.join(EXPLAIN_CACHE_DIR, "xray"),
+    memory_items=EXPLAIN_CACHE_SIZE,
+    disk_max_bytes=EXPLAIN_CACHE_DISK_MB * 1024 * 1024,
+    ttl_seconds=EXPLAIN_CACHE_TTL_SECONDS,
+)
 
 # ============================================================
 # MEDICAL KNOWLEDGE BASE
@@ -110,116 +183,42 @@ MEDICAL_DESCRIPTIONS = {
 # ============================================================
 
 def analyze_symptoms(symptom_text):
-    """Enhanced symptom analysis with risk assessment"""
-    if not symptom_text:
-        return {
-            "risk_category": "Unknown",
-            "risk_score": 0.0,
-            "matched_symptoms": [],
-            "additional_concerns": []
-        }
-    
-    text = symptom_text.lower()
-    
-    # Symptom keywords with severity weights
-    symptom_keywords = {
-        "severe": ["severe", "intense", "extreme", "unbearable", "acute"],
-        "respiratory": ["cough", "breath", "breathing", "shortness", "wheez", "dyspnea"],
-        "fever": ["fever", "temperature", "hot", "chills", "sweating"],
-        "pain": ["pain", "chest pain", "ache", "discomfort", "hurt"],
-        "fatigue": ["tired", "fatigue", "weak", "exhausted", "lethargy"],
-        "mucus": ["mucus", "phlegm", "sputum", "discharge"],
-        "emergency": ["blood", "hemoptysis", "confusion", "unconscious", "severe pain"]
-    }
-    
-    matched = []
-    risk_score = 0.0
-    
-    for category, keywords in symptom_keywords.items():
-        for keyword in keywords:
-            if keyword in text:
-                matched.append(category)
-                if category == "emergency":
-                    risk_score += 0.4
-                elif category == "severe":
-                    risk_score += 0.3
-                elif category in ["respiratory", "fever", "pain"]:
-                    risk_score += 0.2
-                else:
-                    risk_score += 0.1
-                break
-    
-    risk_score = min(risk_score, 1.0)
-    
-    if risk_score >= 0.7:
-        risk_category = "High"
-    elif risk_score >= 0.4:
-        risk_category = "Moderate"
-    elif risk_score >= 0.1:
-        risk_category = "Low"
-    else:
-        risk_category = "Minimal"
-    
-    return {
-        "risk_category": risk_category,
-        "risk_score": risk_score,
-        "matched_symptoms": list(set(matched)),
-        "additional_concerns": ["Seek immediate medical attention" if risk_score >= 0.7 else "Monitor symptoms closely"]
-    }
+    """Enhanced symptom analysis with risk assessment (see symptom_risk.py)"""
+    return score_symptoms(symptom_text)
 
 # ============================================================
 # PREDICTION FUNCTION
 # ============================================================
 
-def predict_image(image_path, symptoms=None):
+def predict_image(image_path, symptoms=None, explain=True):
     """
     High-accuracy prediction using ResNet18 transfer learning
     
     Args:
-        image_path: Path to chest X-ray image
+        image_path: Path to chest X-ray image, or the uploaded bytes
         symptoms: Optional symptom description
+        explain: Compute the GradCAM heatmap now. When False only the label
+                 is computed and the heatmap can be requested later through
+                 explain_prediction(result["prediction_id"]).
         
     Returns:
-        dict: Comprehensive analysis results
+        dict: Comprehensive analysis results. "heatmap_cam" holds the raw
+              7x7 GradCAM map from gradcam.pack_cam (None when explain is
+              False); main.py turns it into heatmap_id / heatmap_url.
     """
     
-    # Load and validate image
-    image = Image.open(image_path).convert("RGB")
-    
-    # Check if image is valid chest X-ray (grayscale check)
-    hsv_img = image.convert("HSV")
-    stat = ImageStat.Stat(hsv_img)
-    avg_saturation = stat.mean[1]
-    
-    if avg_saturation > 45:
-        raise ValueError(f"Invalid Image. High Color Saturation ({avg_saturation:.1f}). Please upload a grayscale Chest X-Ray.")
-    
-    std_dev_brightness = stat.stddev[2]
-    if std_dev_brightness < 10:
-        raise ValueError("Invalid Image. Image is too flat or blank. Please upload a valid scan.")
-    
-    # Transform image (MUST MATCH TRAINING)
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
-    
-    input_tensor = transform(image).unsqueeze(0).to(device)
-    
-    # IMPORTANT: We need gradients for GradCAM even in validation mode
-    # Remove torch.no_grad() but keep model in eval mode
-    
-    # Forward pass
-    output = model(input_tensor)
-    probabilities = torch.softmax(output, dim=1)[0]
+    # Decode (reduced-size for JPEGs), reject non-X-rays on the 224x224
+    # pixels and normalise, in one pass (MUST MATCH TRAINING). The grayscale
+    # model takes the 8-bit grey pixels as they are.
+    grayscale = is_grayscale(registry.get("xray").model)
+    input_tensor = preprocess(image_path, validate_xray=True, model="xray", grayscale=grayscale)
     
-    # Get predictions (detach to get simple float values)
-    normal_confidence = probabilities[0].detach().item()
-    pneumonia_confidence = probabilities[1].detach().item()
+    # Forward pass (+ GradCAM), batched with any concurrent requests
+    probabilities, prediction_idx, cam, model_version = batcher.submit((input_tensor, explain)).result()
     
-    prediction_idx = torch.argmax(output, dim=1).item()
-    primary_confidence = probabilities[prediction_idx].detach().item()
+    normal_confidence = probabilities[0].item()
+    pneumonia_confidence = probabilities[1].item()
+    primary_confidence = probabilities[prediction_idx].item()
     
     # Determine prediction label
     prediction_label = "PNEUMONIA" if prediction_idx == 1 else "NORMAL"
@@ -227,39 +226,13 @@ def predict_image(image_path, symptoms=None):
     # Calculate uncertainty
     uncertainty = 1.0 - abs(normal_confidence - pneumonia_confidence)
     
-    # Generate GradCAM heatmap
-    model.zero_grad()
-    output[0][prediction_idx].backward()
-    
-    # Check if gradients were captured
-    if gradients is None or activations is None:
-        # Fallback empty heatmap if something failed
-        cam = np.zeros((224, 224), dtype=np.float32)
+    if explain:
+        heatmap_cam = pack_cam(cam)
+        prediction_id = None
     else:
-        grads = gradients.detach().cpu().numpy()[0]
-        acts = activations.detach().cpu().numpy()[0]
-        
-        weights = grads.mean(axis=(1,2))
-        cam = np.zeros(acts.shape[1:], dtype=np.float32)
-        
-        for i, w in enumerate(weights):
-            cam += w * acts[i]
-        
-        cam = np.maximum(cam, 0)
-        cam = cv2.resize(cam, (224, 224))
-        if cam.max() != 0:
-            cam = cam / cam.max()
-    
-    # Create heatmap overlay
-    heatmap = cv2.applyColorMap(np.uint8(255 * cam), cv2.COLORMAP_JET)
-    
-    # Save heatmap
-    base_name = os.path.basename(image_path)
-    heatmap_filename = f"heatmap_{base_name}"
-    heatmap_path = os.path.join("uploaded_images", heatmap_filename)
-    
-    os.makedirs("uploaded_images", exist_ok=True)
-    cv2.imwrite(heatmap_path, heatmap)
+        # Keep the upload so the heatmap can be rendered when it's opened
+        prediction_id = explain_cache.put(image_path)
+        heatmap_cam = None
     
     # Get medical information
     medical_info = MEDICAL_DESCRIPTIONS[prediction_label]
@@ -306,9 +279,11 @@ def predict_image(image_path, symptoms=None):
         "risk_level": overall_risk,
         
         # Technical details
-        "heatmap_path": heatmap_path,
-        "file_url": image_path,
-        "model_version": "ResNet18_TransferLearning_v1.0",
+        "heatmap_path": None,
+        "heatmap_cam": heatmap_cam,
+        "prediction_id": prediction_id,
+        "file_url": image_path if isinstance(image_path, str) else None,
+        "model_version": model_version,
         
         # Symptom analysis
         "symptom_analysis": symptom_analysis,
@@ -317,6 +292,27 @@ def predict_image(image_path, symptoms=None):
     
     return result
 
+def explain_prediction(prediction_id):
+    """
+    Compute the GradCAM heatmap for an earlier explain=False prediction
+    
+    Args:
+        prediction_id: "prediction_id" from the predict_image result
+        
+    Returns:
+        dict: Packed low-resolution CAM (gradcam.pack_cam), or None if the
+              upload is no longer cached
+    """
+    data = explain_cache.get(prediction_id)
+    if data is None:
+        return None
+    
+    # Validated when it was first analysed
+    grayscale = is_grayscale(registry.get("xray").model)
+    input_tensor = preprocess(data, model="xray", grayscale=grayscale)
+    _, _, cam, _ = batcher.submit((input_tensor, True)).result()
+    return pack_cam(cam)
+
 # ============================================================
 # TEST FUNCTION
 # ============================================================
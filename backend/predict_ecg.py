@@ -3,14 +3,25 @@ ECG PREDICTION SYSTEM (VISION BASED)
 Analyzes ECG images using trained ResNet18 model and provides detailed report
 """
 
-import torch
-import torch.nn as nn
-from torchvision import transforms, models
-from PIL import Image, ImageStat
-import numpy as np
-import cv2
 import os
 
+import torch
+
+import thread_tuning
+from batching import MicroBatcher
+from gradcam import GradCAM, pack_cam
+from prediction_cache import ExplainCache
+from preprocessing import preprocess
+from metrics import stage
+from architectures import build_ecg_model
+from inference_backends import load_inference_model
+from cpu_modes import apply_cpu_mode
+from model_registry import LoadedModel, load_checkpoint, ModelUnavailable, registry
+from settings import (
+    MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS, BATCH_WORKERS,
+    EXPLAIN_CACHE_SIZE, EXPLAIN_CACHE_DIR, EXPLAIN_CACHE_DISK_MB, EXPLAIN_CACHE_TTL_SECONDS,
+)
+
 # ============================================================
 # CONFIGURATION
 # ============================================================
@@ -21,100 +32,107 @@ device = torch.device("cpu")
 # ============================================================
 # LOAD MODEL
 # ============================================================
-model = models.resnet18(pretrained=False)
-num_features = model.fc.in_features
-model.fc = nn.Sequential(
-    nn.Dropout(0.5),
-    nn.Linear(num_features, 128),
-    nn.ReLU(),
-    nn.Linear(128, NUM_CLASSES)
-)
-
 MODEL_PATH = "ecg_resnet_model.pth"
+MODEL_VERSION = "ECG_ResNet18_Vision_v1.0"
 
 def load_model():
-    if os.path.exists(MODEL_PATH):
-        model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
-        model.eval()
-        model.to(device)
-        return True
-    return False
+    """Build the ECG model, its label-only inference graph and GradCAM"""
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError(f"{MODEL_PATH} not found - ECG model not trained yet")
 
-model_loaded = load_model()
+    model, version = load_checkpoint(lambda: build_ecg_model(NUM_CLASSES), MODEL_PATH, MODEL_VERSION)
+    model.to(device)
+
+    # Label-only predictions can run on a quantized or exported graph
+    # (GradCAM needs the eager model's autograd)
+    infer_model = load_inference_model(model, MODEL_PATH, "ECG")
+
+    # Per-request capture on layer4 (last conv layer)
+    gradcam = GradCAM(model.layer4[1].conv2)
+
+    # Optional channels-last / bf16 autocast (GradCAM's hook stays on the inner layer)
+    model, infer_model = apply_cpu_mode(model, infer_model, "ECG")
+
+    return LoadedModel(model, infer_model, gradcam, version)
+
+# Loaded on first use, or in the background at server startup. A missing
+# checkpoint is remembered by the registry instead of re-checked per request.
+registry.register("ecg", load_model, MODEL_PATH)
 
 # ============================================================
-# GRADCAM HOOKS
+# BATCHED INFERENCE
 # ============================================================
-gradients = None
-activations = None
 
-def backward_hook(module, grad_in, grad_out):
-    global gradients
-    gradients = grad_out[0]
+def run_batch(requests):
+    """
+    Prediction (+ GradCAM when explain is set) for (tensor, explain) pairs,
+    as (probs, pred_idx, cam, model_version) tuples
+    """
+    loaded = registry.get("ecg")
+    results = [None] * len(requests)
+    fast_idx = [i for i, (_, explain) in enumerate(requests) if not explain]
+    explain_idx = [i for i, (_, explain) in enumerate(requests) if explain]
+    
+    if fast_idx:
+        with torch.inference_mode(), stage("ecg", "forward"):
+            batch = torch.stack([requests[i][0] for i in fast_idx]).to(device)
+            probs = torch.softmax(loaded.infer_model(batch), dim=1)
+        for row, i in enumerate(fast_idx):
+            results[i] = (probs[row], probs[row].argmax().item(), None, loaded.version)
+    
+    if explain_idx:
+        batch = torch.stack([requests[i][0] for i in explain_idx]).to(device)
+        with loaded.gradcam.capture() as captured, stage("ecg", "forward"):
+            output = loaded.model(batch)
+        probs = torch.softmax(output, dim=1).detach()
+        pred_idx = torch.argmax(probs, dim=1)
+        
+        with stage("ecg", "gradcam"):
+            cams = loaded.gradcam.compute(captured, output, pred_idx, size=None)
+        
+        for row, i in enumerate(explain_idx):
+            results[i] = (probs[row], pred_idx[row].item(), cams[row], loaded.version)
+    
+    return results
 
-def forward_hook(module, input, output):
-    global activations
-    activations = output
+# Batches use the tuned torch thread count (set after these threads may have started)
+batcher = MicroBatcher("ecg", run_batch, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS, BATCH_WORKERS, prepare=thread_tuning.apply)
 
-# Register hooks on layer4 (last conv layer)
-model.layer4[1].conv2.register_forward_hook(forward_hook)
-model.layer4[1].conv2.register_full_backward_hook(backward_hook)
+# Uploads of explain=False predictions, kept for on-demand heatmaps (on
+# disk too, so the heatmap request can land on any worker)
+explain_cache = ExplainCache(
+    os.path.join(EXPLAIN_CACHE_DIR, "ecg"),
+    memory_items=EXPLAIN_CACHE_SIZE,
+    disk_max_bytes=EXPLAIN_CACHE_DISK_MB * 1024 * 1024,
+    ttl_seconds=EXPLAIN_CACHE_TTL_SECONDS,
+)
 
 # ============================================================
 # ANALYSIS LOGIC
 # ============================================================
 
-def predict_ecg(image_path):
-    if not model_loaded:
-        if not load_model():
-            return {"error": "ECG Model not trained yet"}
+def predict_ecg(image_path, explain=True):
+    try:
+        registry.get("ecg")
+    except ModelUnavailable:
+        return {"error": "ECG Model not trained yet"}
 
-    # Load Image
-    image = Image.open(image_path).convert("RGB")
+    # Decode and normalise (path, or the uploaded bytes)
+    input_tensor = preprocess(image_path, model="ecg")
     
-    # Transform
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
+    # Prediction (+ GradCAM), batched with any concurrent requests
+    probs, pred_idx, cam, model_version = batcher.submit((input_tensor, explain)).result()
     
-    input_tensor = transform(image).unsqueeze(0).to(device)
-    
-    # Prediction
-    output = model(input_tensor)
-    probs = torch.softmax(output, dim=1)[0]
-    
-    pred_idx = torch.argmax(probs).item()
-    confidence = probs[pred_idx].detach().item()
+    confidence = probs[pred_idx].item()
     label = CLASS_NAMES[pred_idx]
-    
-    # GradCAM
-    model.zero_grad()
-    output[0][pred_idx].backward()
-    
-    cam = np.zeros((224, 224), dtype=np.float32)
-    if gradients is not None and activations is not None:
-        grads = gradients.detach().cpu().numpy()[0]
-        acts = activations.detach().cpu().numpy()[0]
-        weights = grads.mean(axis=(1,2))
-        
-        # Initialize cam with size of features (7x7) NOT image size (224x224)
-        cam = np.zeros(acts.shape[1:], dtype=np.float32)
-        
-        for i, w in enumerate(weights):
-            cam += w * acts[i]
             
-        cam = np.maximum(cam, 0)
-        cam = cv2.resize(cam, (224, 224))
-        if cam.max() != 0:
-            cam = cam / cam.max()
-            
-    # Heatmap
-    heatmap = cv2.applyColorMap(np.uint8(255 * cam), cv2.COLORMAP_JET)
-    base_name = os.path.basename(image_path)
-    heatmap_path = os.path.join("uploaded_images", f"heatmap_ecg_{base_name}")
-    cv2.imwrite(heatmap_path, heatmap)
+    # Raw low-resolution heatmap (now, or later through explain_prediction)
+    prediction_id = None
+    heatmap_cam = None
+    if explain:
+        heatmap_cam = pack_cam(cam)
+    else:
+        prediction_id = explain_cache.put(image_path)
     
     # Report generation
     report = generate_report(label, confidence)
@@ -122,10 +140,23 @@ def predict_ecg(image_path):
     return {
         "prediction": label,
         "confidence": round(confidence * 100, 2),
-        "heatmap_path": heatmap_path,
+        "heatmap_path": None,
+        "heatmap_cam": heatmap_cam,
+        "prediction_id": prediction_id,
+        "model_version": model_version,
         "report": report
     }
 
+def explain_prediction(prediction_id):
+    """Packed low-resolution GradCAM map for an explain=False prediction, None if expired"""
+    data = explain_cache.get(prediction_id)
+    if data is None:
+        return None
+    
+    input_tensor = preprocess(data, model="ecg")
+    _, _, cam, _ = batcher.submit((input_tensor, True)).result()
+    return pack_cam(cam)
+
 def generate_report(label, confidence):
     descriptions = {
         "Normal": "Normal Sinus Rhythm. The ECG shows a regular rhythm with normal intervals and wave morphology.",
@@ -0,0 +1,226 @@
+"""
+PREDICTION CACHE
+Content-addressed cache of finished analysis results, so re-submitting the
+same scan skips inference, GradCAM and the Cloudinary uploads. Also backs
+the uploads kept for on-demand heatmaps (ExplainCache).
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from caching import LRUCache
+
+# Longest gap between disk size resyncs (other workers write to the same directory)
+DISK_SYNC_SECONDS = 60
+
+
+class PredictionCache:
+    """
+    Two-tier result cache keyed by upload bytes, model version and symptoms
+
+    Lookups go to an in-memory LRU first, then to JSON files on disk. Disk
+    entries expire after `ttl_seconds` and the oldest-used files are removed
+    once the directory grows past `disk_max_bytes`. Worker processes may
+    share `cache_dir`: the directory size is re-read from disk at least every
+    DISK_SYNC_SECONDS, so the cap holds for all of them together (with that
+    much lag) rather than per worker.
+    """
+
+    def __init__(self, cache_dir, memory_items=512, disk_max_bytes=256 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = LRUCache(memory_items)
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+        self._last_sync = time.time()
+
+    @staticmethod
+    def make_key(data, model_version, symptoms=None):
+        """Cache key for raw upload bytes analysed by `model_version`"""
+        digest = hashlib.sha256(data).hexdigest()
+        parts = [digest, model_version or "", (symptoms or "").strip()]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    # ---- Lookup / store ----
+
+    def get(self, key, memory=True):
+        """
+        Cached result dict for `key`, or None
+
+        memory=False reads the disk entry and leaves the memory tier alone,
+        for values other worker processes may have replaced since.
+        """
+        now = time.time()
+
+        entry = self._memory.get(key) if memory else None
+        if entry is not None and now - entry[0] < self.ttl_seconds:
+            self._count("memory_hits")
+            return entry[1]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+
+        if now - stored["cached_at"] >= self.ttl_seconds:
+            self._remove(path)
+            self._count("misses")
+            return None
+
+        # Refresh mtime so disk eviction is least-recently-used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        if memory:
+            self._memory.put(key, (stored["cached_at"], stored["result"]))
+        self._count("disk_hits")
+        return stored["result"]
+
+    def put(self, key, result):
+        """Store a JSON-serialisable result dict under `key`"""
+        cached_at = time.time()
+        self._memory.put(key, (cached_at, result))
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique across threads and processes sharing the directory
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"cached_at": cached_at, "result": result}, f)
+
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._disk_bytes += os.path.getsize(path) - previous
+            self._counters["stores"] += 1
+            due = self._disk_bytes > self.disk_max_bytes or cached_at - self._last_sync >= DISK_SYNC_SECONDS
+
+        if due:
+            self._evict()
+
+    # ---- Disk maintenance ----
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+            self._counters["evictions"] += 1
+
+    def _evict(self):
+        """
+        Resync the size from disk, then drop expired entries and least
+        recently used ones until under the cap
+        """
+        now = time.time()
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        with self._lock:
+            # Includes what other workers stored since the last sync
+            self._disk_bytes = sum(size for _, size, _ in entries)
+            self._last_sync = now
+        remaining = []
+        for path, size, mtime in entries:
+            if now - mtime >= self.ttl_seconds:
+                self._remove(path)
+            else:
+                remaining.append(path)
+
+        # Leave some headroom so we don't evict on every store
+        target = self.disk_max_bytes * 0.9
+        for path in remaining:
+            if self._disk_bytes <= target:
+                break
+            self._remove(path)
+
+    # ---- Statistics ----
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            disk_bytes = self._disk_bytes
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        return {
+            **counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_bytes": disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# prediction ids are uuid4 hex strings (they end up in file paths)
+PREDICTION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ExplainCache:
+    """
+    Uploads of explain=False predictions by prediction id, for on-demand heatmaps
+
+    Stored in a PredictionCache, so they are on disk as well as in memory and
+    every worker process sharing `cache_dir` can explain a prediction made
+    by another one. The upload itself is kept (not the preprocessed tensor):
+    it is usually smaller, and is preprocessed again for whichever model
+    variant is serving when the heatmap is requested.
+    """
+
+    def __init__(self, cache_dir, memory_items=128, disk_max_bytes=512 * 1024 * 1024, ttl_seconds=24 * 3600):
+        self._cache = PredictionCache(cache_dir, memory_items, disk_max_bytes, ttl_seconds)
+
+    def put(self, source):
+        """Keep an upload (bytes, or a file path) and return its new prediction id"""
+        if not isinstance(source, (bytes, bytearray)):
+            with open(source, "rb") as f:
+                source = f.read()
+        prediction_id = uuid.uuid4().hex
+        self._cache.put(prediction_id, {"upload": base64.b64encode(source).decode("ascii")})
+        return prediction_id
+
+    def get(self, prediction_id):
+        """Upload bytes for `prediction_id`, or None if unknown or expired"""
+        if not PREDICTION_ID.match(prediction_id or ""):
+            return None
+        entry = self._cache.get(prediction_id)
+        return base64.b64decode(entry["upload"]) if entry is not None else None
+
+    def stats(self):
+        return self._cache.stats()
@@ -0,0 +1,146 @@
+"""
+IMAGE PREPROCESSING
+One-pass decode, validation and normalisation shared by the X-ray and ECG
+predictors (MUST MATCH TRAINING: 224x224 resize + ImageNet normalisation)
+"""
+
+import io
+
+import numpy as np
+import torch
+from PIL import Image, UnidentifiedImageError
+
+from metrics import stage
+
+IMAGE_SIZE = 224
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
+# JPEGs are draft-decoded to at least this multiple of the target size, so
+# the final resize still averages over real pixels; decoding straight at
+# ~224px shifts the normalised inputs visibly more (benchmark_preprocessing.py)
+DRAFT_FACTOR = 2
+
+# X-ray validation thresholds (HSV saturation mean / brightness stddev, 0-255)
+MAX_SATURATION = 45
+MIN_BRIGHTNESS_STDDEV = 10
+
+# (x / 255 - mean) / std folded into one multiply-add per channel
+_SCALE = torch.tensor([1 / (255 * s) for s in STD]).view(3, 1, 1)
+_BIAS = torch.tensor([-m / s for m, s in zip(MEAN, STD)]).view(3, 1, 1)
+
+
+def load_image(source, size=IMAGE_SIZE, grayscale=False):
+    """
+    Decode an upload (bytes) or a file path straight to a size x size RGB array
+
+    JPEGs are decoded at the smallest DCT scale that is still at least
+    DRAFT_FACTOR x `size` (PIL's draft mode), so a 2000px scan never gets
+    fully decoded just to be shrunk to 224px. The image is then resized once.
+
+    With `grayscale`, images stored as single-channel grey are returned as a
+    (size, size) array without the RGB expansion; colour images still come
+    back as RGB so check_xray can see their saturation.
+
+    Returns:
+        np.ndarray: (size, size, 3) uint8, or (size, size) uint8
+    """
+    try:
+        image = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    except UnidentifiedImageError:
+        raise ValueError("Invalid Image. Unsupported or corrupt image file.")
+    if grayscale and image.mode == "L":
+        if image.format == "JPEG":
+            image.draft("L", (size * DRAFT_FACTOR, size * DRAFT_FACTOR))
+        return np.array(image.resize((size, size), Image.BILINEAR))
+    if image.format == "JPEG":
+        image.draft("RGB", (size * DRAFT_FACTOR, size * DRAFT_FACTOR))
+
+    if image.mode in ("RGB", "L"):
+        # Resizing before the grey -> RGB expansion does a third of the work
+        image = image.resize((size, size), Image.BILINEAR).convert("RGB")
+    else:
+        image = image.convert("RGB").resize((size, size), Image.BILINEAR)
+    return np.array(image)
+
+
+def check_xray(pixels):
+    """
+    Reject colourful or flat images, computed on the resized pixels
+
+    Same HSV statistics as before (mean saturation, brightness stddev), but
+    vectorised over the 224x224 array instead of converting the full-size
+    image to HSV. A (H, W) grey array has no saturation to check.
+    """
+    if pixels.ndim == 2:
+        if pixels.std() < MIN_BRIGHTNESS_STDDEV:
+            raise ValueError("Invalid Image. Image is too flat or blank. Please upload a valid scan.")
+        return
+
+    # Elementwise max/min over the channel planes (much faster than axis=2 reductions)
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    value = np.maximum(np.maximum(r, g), b)
+    chroma = value - np.minimum(np.minimum(r, g), b)
+    # Black pixels have zero chroma, so dividing by max(value, 1) keeps them at 0
+    saturation = chroma.astype(np.float32) * 255 / np.maximum(value, 1)
+
+    avg_saturation = saturation.mean()
+    if avg_saturation > MAX_SATURATION:
+        raise ValueError(f"Invalid Image. High Color Saturation ({avg_saturation:.1f}). Please upload a grayscale Chest X-Ray.")
+
+    if value.std() < MIN_BRIGHTNESS_STDDEV:
+        raise ValueError("Invalid Image. Image is too flat or blank. Please upload a valid scan.")
+
+
+def to_tensor(pixels, out=None):
+    """
+    Normalised (3, H, W) float tensor from an (H, W, 3) uint8 array
+
+    Writes into `out` (e.g. one row of a preallocated batch tensor) when given.
+    """
+    chw = torch.from_numpy(pixels).permute(2, 0, 1)
+    if out is None:
+        out = torch.empty(chw.shape, dtype=torch.float32)
+    torch.addcmul(_BIAS, chw, _SCALE, out=out)
+    return out
+
+
+def to_grayscale_tensor(pixels, out=None):
+    """
+    (1, H, W) uint8 tensor for the grayscale model, which normalises itself
+
+    Colour (H, W, 3) input is converted with the ITU-R 601 luma weights.
+    """
+    if pixels.ndim == 3:
+        pixels = np.array(Image.fromarray(pixels).convert("L"))
+    grey = torch.from_numpy(pixels).unsqueeze(0)
+    if out is None:
+        return grey
+    out.copy_(grey)
+    return out
+
+
+def example_batch(batch_size, grayscale=False, generator=None):
+    """Random batch in a model's input format (normalised RGB, or 8-bit grey)"""
+    if grayscale:
+        return torch.randint(0, 256, (batch_size, 1, IMAGE_SIZE, IMAGE_SIZE), dtype=torch.uint8, generator=generator)
+    return torch.randn(batch_size, 3, IMAGE_SIZE, IMAGE_SIZE, generator=generator)
+
+
+def preprocess(source, validate_xray=False, out=None, model="image", grayscale=False):
+    """
+    Decode, (optionally) validate as an X-ray and normalise one image
+
+    With `grayscale` the result is the (1, H, W) uint8 input of the
+    grayscale X-ray model instead (see grayscale_model.py). Each stage is
+    timed into the stage-duration metric under `model`.
+    """
+    with stage(model, "decode"):
+        pixels = load_image(source, grayscale=grayscale)
+    if validate_xray:
+        with stage(model, "validate"):
+            check_xray(pixels)
+    with stage(model, "normalize"):
+        if grayscale:
+            return to_grayscale_tensor(pixels, out)
+        return to_tensor(pixels, out)
@@ -0,0 +1,180 @@
+"""
+REQUEST PROFILING
+Runs a single admin-requested prediction under the PyTorch profiler and a
+Python stack sampler, and saves the results for offline inspection
+
+Each profile is stored under PROFILE_DIR as
+    <id>.trace.json   Chrome trace of the torch ops (chrome://tracing, Perfetto)
+    <id>.folded.txt   sampled Python stacks in folded format (speedscope,
+                      flamegraph.pl, inferno)
+    <id>.json         summary: label, duration, top ops, sample count
+and only the newest PROFILE_MAX_TRACES profiles are kept. Nothing here is
+touched by requests that don't ask for a profile.
+"""
+
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+from settings import PROFILE_DIR, PROFILE_MAX_TRACES, PROFILE_SAMPLE_INTERVAL_MS
+
+ARTIFACTS = {"trace": ".trace.json", "flamegraph": ".folded.txt", "summary": ".json"}
+
+# Threads doing a request's work: the inference pool and the micro-batchers
+SAMPLED_THREADS = ("inference", "batcher-", "bulk-decode")
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# The torch profiler is process-wide, so profiles run one at a time
+_lock = threading.Lock()
+
+# ============================================================
+# PYTHON STACK SAMPLER
+# ============================================================
+
+class StackSampler:
+    """
+    Samples the Python stacks of the pipeline threads every `interval_ms`
+
+    Pure Python (sys._current_frames), so it needs no extra dependency; the
+    folded output counts how often each stack was seen. Idle threads are
+    left out.
+    """
+
+    def __init__(self, interval_ms=PROFILE_SAMPLE_INTERVAL_MS, thread_prefixes=SAMPLED_THREADS):
+        self.interval = max(0.0005, interval_ms / 1000.0)
+        self.thread_prefixes = thread_prefixes
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, "")
+                if not name.startswith(self.thread_prefixes):
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                # Pool and batcher threads block in queue.get only while idle
+                if any(entry.startswith("get (queue.py") for entry in frames):
+                    continue
+                self.stacks[";".join([name] + frames[::-1])] += 1
+            self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+# ============================================================
+# PROFILED CALLS
+# ============================================================
+
+def torch_profiler():
+    """
+    CPU profiler that also records the micro-batcher threads, where the
+    forward and GradCAM passes run (older torch only sees the calling thread)
+    """
+    try:
+        config = torch._C._profiler._ExperimentalConfig(profile_all_threads=True)
+    except (AttributeError, TypeError):
+        config = None
+    return profile(activities=[ProfilerActivity.CPU], record_shapes=True, experimental_config=config)
+
+
+def run(label, fn, *args):
+    """
+    Call `fn(*args)` under both profilers and save the artifacts
+
+    Concurrent requests batched with this one show up in the trace too.
+
+    Returns:
+        (result, profile_id)
+    """
+    with _lock:
+        profile_id = uuid.uuid4().hex
+        sampler = StackSampler()
+        started = time.perf_counter()
+
+        with torch_profiler() as torch_profile:
+            sampler.start()
+            try:
+                result = fn(*args)
+            finally:
+                sampler.stop()
+        seconds = time.perf_counter() - started
+
+        save(profile_id, label, seconds, torch_profile, sampler)
+    print(f"✓ Profiled {label} in {seconds * 1000:.1f} ms (profile {profile_id})")
+    return result, profile_id
+
+
+def save(profile_id, label, seconds, torch_profile, sampler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile_id)
+
+    torch_profile.export_chrome_trace(base + ARTIFACTS["trace"])
+    with open(base + ARTIFACTS["flamegraph"], "w") as f:
+        f.write(sampler.folded())
+
+    top_ops = sorted(torch_profile.key_averages(), key=lambda event: event.self_cpu_time_total, reverse=True)[:15]
+    summary = {
+        "profile_id": profile_id,
+        "label": label,
+        "created_at": time.time(),
+        "seconds": round(seconds, 4),
+        "torch_threads": torch.get_num_threads(),
+        "python_samples": sampler.samples,
+        "sample_interval_ms": sampler.interval * 1000,
+        "top_ops": [
+            {"op": event.key, "calls": event.count, "self_cpu_ms": round(event.self_cpu_time_total / 1000, 3)}
+            for event in top_ops
+        ],
+        "artifacts": {kind: profile_id + suffix for kind, suffix in ARTIFACTS.items()},
+    }
+    with open(base + ARTIFACTS["summary"], "w") as f:
+        json.dump(summary, f, indent=2)
+
+    prune()
+
+
+def prune(keep=PROFILE_MAX_TRACES):
+    """Delete all but the newest `keep` profiles"""
+    summaries = sorted(glob.glob(os.path.join(PROFILE_DIR, "*" + ARTIFACTS["summary"])), key=os.path.getmtime)
+    summaries = [path for path in summaries if not path.endswith(ARTIFACTS["trace"])]
+    for path in summaries[:max(0, len(summaries) - keep)]:
+        profile_id = os.path.basename(path)[:-len(ARTIFACTS["summary"])]
+        for suffix in ARTIFACTS.values():
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except OSError:
+                pass
+
+
+def artifact_path(profile_id, artifact):
+    """Path of one saved artifact, or None if the id/artifact is unknown"""
+    if not PROFILE_ID.match(profile_id) or artifact not in ARTIFACTS:
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ARTIFACTS[artifact])
+    return path if os.path.exists(path) else None
@@ -0,0 +1,218 @@
+"""
+INT8 QUANTIZATION PIPELINE
+Builds dynamically and statically quantized variants of the X-ray and ECG
+ResNet18 models, calibrates the static ones on the ImageFolder datasets and
+reports accuracy vs latency against the fp32 model
+
+Usage (from backend/):
+    python quantize_models.py
+
+A variant is saved as <checkpoint>_<precision>.pt (TorchScript) only if its
+test accuracy stays within ACCURACY_TOLERANCE of fp32. Serve it with
+MODEL_PRECISION=int8_dynamic or MODEL_PRECISION=int8_static.
+"""
+
+import copy
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+from torch.utils.data import DataLoader
+from torchvision import datasets, transforms
+
+from architectures import build_xray_model, build_ecg_model
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+XRAY_DATASET_PATH = os.getenv("XRAY_DATASET_PATH", os.path.join("..", "chest_xray"))
+ECG_DATASET_PATH = os.getenv("ECG_DATASET_PATH", "ecg_image_data")
+
+MODELS = {
+    "xray": {"build": build_xray_model, "checkpoint": "xray_pneumonia_model.pth", "dataset": XRAY_DATASET_PATH},
+    "ecg": {"build": build_ecg_model, "checkpoint": "ecg_resnet_model.pth", "dataset": ECG_DATASET_PATH},
+}
+
+PRECISIONS = ["int8_dynamic", "int8_static"]
+
+BATCH_SIZE = 32
+CALIBRATION_BATCHES = 10       # 320 training images
+ACCURACY_TOLERANCE = 1.0       # max accuracy drop vs fp32, in percentage points
+LATENCY_REPEATS = 20
+REPORT_PATH = "quantization_report.json"
+
+# Validation/Test transforms (MUST MATCH TRAINING)
+val_transforms = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
+# ============================================================
+# SERVING HELPERS
+# ============================================================
+
+def variant_path(checkpoint_path, precision):
+    """xray_pneumonia_model.pth -> xray_pneumonia_model_int8_static.pt"""
+    return f"{os.path.splitext(checkpoint_path)[0]}_{precision}.pt"
+
+
+def select_engine():
+    """Pick the best quantized kernel backend available on this CPU"""
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    return None
+
+
+def load_quantized_model(checkpoint_path, precision):
+    """Load a saved quantized variant, or None if it hasn't been built"""
+    path = variant_path(checkpoint_path, precision)
+    if not os.path.exists(path):
+        return None
+    select_engine()
+    model = torch.jit.load(path, map_location="cpu")
+    model.eval()
+    return model
+
+# ============================================================
+# QUANTIZATION
+# ============================================================
+
+def quantize_dynamic_variant(model):
+    """INT8 weights for the Linear head, activations quantized on the fly"""
+    return quantize_dynamic(copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_variant(model, calibration_loader):
+    """Full INT8 graph (FX mode) with activation ranges from calibration data"""
+    engine = select_engine()
+    example_inputs = (torch.randn(1, 3, 224, 224),)
+    prepared = prepare_fx(copy.deepcopy(model), get_default_qconfig_mapping(engine), example_inputs)
+
+    with torch.inference_mode():
+        for i, (images, _) in enumerate(calibration_loader):
+            if i >= CALIBRATION_BATCHES:
+                break
+            prepared(images)
+
+    return convert_fx(prepared)
+
+
+def to_torchscript(model):
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, torch.randn(1, 3, 224, 224))
+    return torch.jit.freeze(traced.eval())
+
+# ============================================================
+# EVALUATION
+# ============================================================
+
+def evaluate(model, loader):
+    """Accuracy (%) and the list of predicted class indices"""
+    predictions, correct, total = [], 0, 0
+    with torch.inference_mode():
+        for images, labels in loader:
+            predicted = model(images).argmax(dim=1)
+            correct += (predicted == labels).sum().item()
+            total += labels.size(0)
+            predictions.extend(predicted.tolist())
+    return 100 * correct / max(total, 1), predictions
+
+
+def measure_latency(model, batch_size):
+    """Mean milliseconds per image for one forward pass of `batch_size`"""
+    inputs = torch.randn(batch_size, 3, 224, 224)
+    with torch.inference_mode():
+        for _ in range(3):
+            model(inputs)
+        start = time.perf_counter()
+        for _ in range(LATENCY_REPEATS):
+            model(inputs)
+    return (time.perf_counter() - start) / LATENCY_REPEATS / batch_size * 1000
+
+
+def quantize_model(name, config):
+    print("\n" + "="*60)
+    print(f"QUANTIZING {name.upper()} MODEL")
+    print("="*60)
+
+    if not os.path.exists(config["checkpoint"]):
+        print(f"Checkpoint not found: {config['checkpoint']}")
+        return None
+
+    model = config["build"]()
+    model.load_state_dict(torch.load(config["checkpoint"], map_location="cpu"))
+    model.eval()
+
+    train_dataset = datasets.ImageFolder(os.path.join(config["dataset"], "train"), transform=val_transforms)
+    test_dataset = datasets.ImageFolder(os.path.join(config["dataset"], "test"), transform=val_transforms)
+    calibration_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True, num_workers=0)
+    test_loader = DataLoader(test_dataset, batch_size=BATCH_SIZE, shuffle=False, num_workers=0)
+
+    fp32_accuracy, fp32_predictions = evaluate(model, test_loader)
+    report = {
+        "fp32": {
+            "accuracy": round(fp32_accuracy, 2),
+            "latency_ms_batch1": round(measure_latency(model, 1), 2),
+            "latency_ms_batch8": round(measure_latency(model, 8), 2),
+        }
+    }
+    print(f"fp32: accuracy {fp32_accuracy:.2f}%")
+
+    for precision in PRECISIONS:
+        if precision == "int8_dynamic":
+            quantized = quantize_dynamic_variant(model)
+        else:
+            quantized = quantize_static_variant(model, calibration_loader)
+        scripted = to_torchscript(quantized)
+
+        accuracy, predictions = evaluate(scripted, test_loader)
+        agreement = 100 * sum(a == b for a, b in zip(predictions, fp32_predictions)) / max(len(predictions), 1)
+        accepted = fp32_accuracy - accuracy <= ACCURACY_TOLERANCE
+
+        report[precision] = {
+            "accuracy": round(accuracy, 2),
+            "accuracy_drop": round(fp32_accuracy - accuracy, 2),
+            "agreement_with_fp32": round(agreement, 2),
+            "latency_ms_batch1": round(measure_latency(scripted, 1), 2),
+            "latency_ms_batch8": round(measure_latency(scripted, 8), 2),
+            "accepted": accepted,
+        }
+
+        if accepted:
+            path = variant_path(config["checkpoint"], precision)
+            torch.jit.save(scripted, path)
+            print(f"✓ {precision}: accuracy {accuracy:.2f}% (agreement {agreement:.1f}%) - saved {path}")
+        else:
+            print(f"✗ {precision}: accuracy {accuracy:.2f}% drops more than {ACCURACY_TOLERANCE} points - not saved")
+
+    return report
+
+
+if __name__ == "__main__":
+    full_report = {"engine": select_engine(), "tolerance": ACCURACY_TOLERANCE, "models": {}}
+
+    for name, config in MODELS.items():
+        report = quantize_model(name, config)
+        if report is not None:
+            full_report["models"][name] = report
+
+    print("\n" + "="*60)
+    print("ACCURACY vs LATENCY")
+    print("="*60)
+    print(f"{'model':<6} {'variant':<14} {'acc %':>7} {'ms/img b1':>10} {'ms/img b8':>10} {'accepted':>9}")
+    for name, report in full_report["models"].items():
+        for variant, row in report.items():
+            accepted = "-" if variant == "fp32" else ("yes" if row["accepted"] else "no")
+            print(f"{name:<6} {variant:<14} {row['accuracy']:>7.2f} {row['latency_ms_batch1']:>10.2f} {row['latency_ms_batch8']:>10.2f} {accepted:>9}")
+
+    with open(REPORT_PATH, "w") as f:
+        json.dump(full_report, f, indent=2)
+    print(f"\nReport saved to {REPORT_PATH}")
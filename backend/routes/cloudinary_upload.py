@@ -1,7 +1,8 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+import time
 from cloudinary_config import upload_to_cloudinary
-import tempfile
-import os
+from upload_manager import record_upload
 
 router = APIRouter()
 
@@ -14,29 +15,24 @@ async def upload_image(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Only image files are allowed")
 
-    tmp_path = None
-    try:
-        # save to temp
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmp.write(await file.read())
-            tmp_path = tmp.name
+    data = await file.read()
 
-        # upload to cloudinary (use your existing function)
-        result = upload_to_cloudinary(
-            tmp_path,
-            folder=f"patient_files/{uid}",
-            resource_type="image"
-        )
+    # stream the upload to cloudinary straight from memory
+    started = time.perf_counter()
+    result = await run_in_threadpool(
+        upload_to_cloudinary,
+        data,
+        folder=f"patient_files/{uid}",
+        resource_type="image",
+        filename=file.filename
+    )
+    record_upload("patient_file", result, time.perf_counter() - started)
 
-        if not result.get("success"):
-            raise HTTPException(status_code=500, detail=result.get("error", "Cloudinary upload failed"))
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=result.get("error", "Cloudinary upload failed"))
 
-        return {
-            "success": True,
-            "url": result["url"],
-            "public_id": result["public_id"],
-        }
-
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
\ No newline at end of file
+    return {
+        "success": True,
+        "url": result["url"],
+        "public_id": result["public_id"],
+    }
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+BACKEND SETTINGS
+Runtime configuration read from environment variables (or a local .env file)
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _int(name, default):
+    return int(os.getenv(name, default))
+
+def _float(name, default):
+    return float(os.getenv(name, default))
+
+def _bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+# ============================================================
+# MICRO-BATCHING
+# ============================================================
+
+# Largest number of requests fused into one forward/GradCAM pass
+MAX_BATCH_SIZE = _int("MAX_BATCH_SIZE", 8)
+
+# How long the first request in a batch waits for others to join (ms)
+MAX_BATCH_WAIT_MS = _float("MAX_BATCH_WAIT_MS", 5.0)
+
+# Batches of the same model allowed to run concurrently
+BATCH_WORKERS = _int("BATCH_WORKERS", 2)
+
+# ============================================================
+# INFERENCE EXECUTOR
+# ============================================================
+
+# Worker threads running blocking preprocessing/inference calls
+INFERENCE_WORKERS = _int("INFERENCE_WORKERS", 8)
+
+# Requests allowed to wait for a free worker before we answer 503
+INFERENCE_QUEUE_SIZE = _int("INFERENCE_QUEUE_SIZE", 32)
+
+# ============================================================
+# CPU THREADS
+# ============================================================
+
+# Intra-op threads per worker process for the model forward/backward passes
+# (0 = benchmark candidate counts once the X-ray model is loaded and pin the best)
+TORCH_THREADS = _int("TORCH_THREADS", 0)
+
+# Inter-op threads (we never run ops in parallel across the graph)
+TORCH_INTEROP_THREADS = _int("TORCH_INTEROP_THREADS", 1)
+
+# uvicorn worker processes sharing this machine's cores (uvicorn reads the same variable)
+SERVER_WORKERS = _int("WEB_CONCURRENCY", 1)
+
+# ============================================================
+# BULK PREDICTION
+# ============================================================
+
+# Images per forward pass in /predict/bulk
+BULK_BATCH_SIZE = _int("BULK_BATCH_SIZE", 16)
+
+# Threads decoding and validating bulk uploads
+BULK_DECODE_WORKERS = _int("BULK_DECODE_WORKERS", 4)
+
+# Most images processed from one bulk request (the rest are reported as truncated)
+BULK_MAX_IMAGES = _int("BULK_MAX_IMAGES", 1000)
+
+# Largest uncompressed image accepted from a zip archive
+BULK_MAX_IMAGE_MB = _int("BULK_MAX_IMAGE_MB", 50)
+
+# ============================================================
+# ON-DEMAND GRADCAM
+# ============================================================
+
+# Uploads kept for /predict/{id}/heatmap after explain=false: the most recent
+# in memory, all of them on disk so every worker process sharing the
+# directory can serve the heatmap (point it at a shared volume across hosts)
+EXPLAIN_CACHE_SIZE = _int("EXPLAIN_CACHE_SIZE", 128)
+EXPLAIN_CACHE_DIR = os.getenv("EXPLAIN_CACHE_DIR", "explain_cache")
+EXPLAIN_CACHE_DISK_MB = _int("EXPLAIN_CACHE_DISK_MB", 512)
+EXPLAIN_CACHE_TTL_SECONDS = _int("EXPLAIN_CACHE_TTL_SECONDS", 24 * 3600)
+
+# ============================================================
+# PREDICTION CACHE
+# ============================================================
+
+PREDICTION_CACHE_DIR = os.getenv("PREDICTION_CACHE_DIR", "prediction_cache")
+PREDICTION_CACHE_MEMORY_ITEMS = _int("PREDICTION_CACHE_MEMORY_ITEMS", 512)
+PREDICTION_CACHE_DISK_MB = _int("PREDICTION_CACHE_DISK_MB", 256)
+PREDICTION_CACHE_TTL_SECONDS = _int("PREDICTION_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+
+# ============================================================
+# HEATMAPS
+# ============================================================
+
+# Heatmap ids carry the raw GradCAM map, so nothing is stored server side and
+# /heatmaps/{id} URLs kept in patient records never expire.
+
+# Rendered heatmap/overlay images kept in memory, by (id, size, format, overlay),
+# capped by count and by total size
+HEATMAP_RENDER_CACHE_ITEMS = _int("HEATMAP_RENDER_CACHE_ITEMS", 256)
+HEATMAP_RENDER_CACHE_MB = _int("HEATMAP_RENDER_CACHE_MB", 32)
+
+# Largest image side /heatmaps/{id} renders (the UI shows them at 224px)
+HEATMAP_MAX_SIZE = _int("HEATMAP_MAX_SIZE", 1024)
+
+# ============================================================
+# UPLOAD HANDLING
+# ============================================================
+
+# Also keep uploads under UPLOAD_FOLDER (debug/archive, and heatmap overlays;
+# by default everything stays in memory and is streamed to Cloudinary)
+ARCHIVE_UPLOADS = _bool("ARCHIVE_UPLOADS", False)
+
+# Archived uploads are stored by content hash (served at /uploaded_images);
+# past the size cap the least recently used ones are evicted
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploaded_images")
+UPLOAD_STORE_MB = _int("UPLOAD_STORE_MB", 1024)
+UPLOAD_TTL_SECONDS = _int("UPLOAD_TTL_SECONDS", 30 * 24 * 3600)
+
+# ============================================================
+# BACKGROUND UPLOADS
+# ============================================================
+
+# Parallel Cloudinary uploads (also the keep-alive connection pool size)
+UPLOAD_WORKERS = _int("UPLOAD_WORKERS", 4)
+
+# Upload jobs remembered for /uploads/{upload_id}
+UPLOAD_JOBS_KEPT = _int("UPLOAD_JOBS_KEPT", 1024)
+
+# Job statuses are also written here, so /uploads/{upload_id} answers on
+# every worker process sharing the directory (a shared volume across hosts)
+UPLOAD_STATUS_DIR = os.getenv("UPLOAD_STATUS_DIR", "upload_status")
+UPLOAD_STATUS_TTL_SECONDS = _int("UPLOAD_STATUS_TTL_SECONDS", 24 * 3600)
+
+# "cloudinary", or "local" for an on-disk stand-in used in development/tests
+UPLOAD_BACKEND = os.getenv("UPLOAD_BACKEND", "cloudinary")
+
+# Artificial latency added by the local stand-in, to mimic the real round-trip
+LOCAL_UPLOAD_DELAY_MS = _float("LOCAL_UPLOAD_DELAY_MS", 0.0)
+
+# ============================================================
+# INFERENCE BACKEND
+# ============================================================
+
+# "fp32", or a variant built by quantize_models.py: "int8_dynamic" / "int8_static".
+# Only label-only (explain=false) inference uses it; GradCAM stays on fp32.
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32")
+
+# Label-only forward passes: "eager", or an export from export_models.py:
+# "torchscript" / "onnxruntime" (checked against eager at startup)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+
+# Run the eager models (label-only and GradCAM) in channels-last memory format
+CHANNELS_LAST = _bool("CHANNELS_LAST", False)
+
+# ...and under bfloat16 autocast on CPUs that support it (AVX512-BF16 / AMX).
+# Both are checked against fp32 at load time and dropped if unsupported or off.
+BF16_AUTOCAST = _bool("BF16_AUTOCAST", False)
+
+# Serve the single-channel X-ray model: conv1 and the ImageNet normalisation
+# folded to take 8-bit grey directly (checked against the RGB model at load
+# time; label-only inference then stays on the eager model)
+XRAY_GRAYSCALE = _bool("XRAY_GRAYSCALE", False)
+
+# ============================================================
+# MODEL LOADING
+# ============================================================
+
+# "background" (start loading at startup, serve /ready once warm),
+# "eager" (block startup until loaded) or "lazy" (load on first request)
+MODEL_LOADING = os.getenv("MODEL_LOADING", "background")
+
+# Run a forward + GradCAM pass right after loading
+MODEL_WARMUP = _bool("MODEL_WARMUP", True)
+
+# Memory-map checkpoints so every uvicorn worker shares one read-only copy of
+# the weights through the page cache (see benchmark_memory.py)
+SHARED_WEIGHTS = _bool("SHARED_WEIGHTS", False)
+
+# Models that must be ready before /ready reports 200 (comma-separated)
+REQUIRED_MODELS = [name.strip() for name in os.getenv("REQUIRED_MODELS", "xray").split(",") if name.strip()]
+
+# Poll the checkpoint files and hot-reload changed weights (0 = off; reloads
+# can still be triggered through POST /admin/models/{name}/reload)
+MODEL_WATCH_INTERVAL_SECONDS = _float("MODEL_WATCH_INTERVAL_SECONDS", 0)
+
+# ============================================================
+# ADMIN
+# ============================================================
+
+# Token expected in the X-Admin-Token header of /admin endpoints (unset = disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# ============================================================
+# PROFILING
+# ============================================================
+
+# Where admin-requested per-request profiles (?profile=true / X-Profile: 1) are saved
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Profiles kept on disk; the oldest are deleted beyond this
+PROFILE_MAX_TRACES = _int("PROFILE_MAX_TRACES", 20)
+
+# Interval of the Python stack sampler (ms)
+PROFILE_SAMPLE_INTERVAL_MS = _float("PROFILE_SAMPLE_INTERVAL_MS", 2.0)
@@ -0,0 +1,80 @@
+"""
+GRADCAM CONCURRENCY STRESS TEST
+Runs many GradCAM explanations from parallel threads and checks every result
+against the serial output for the same input
+
+Usage (from backend/, with the model weights in place):
+    python stress_test_gradcam.py
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+import predict
+import predict_ecg
+from grayscale_model import is_grayscale
+from model_registry import registry
+from preprocessing import example_batch
+
+NUM_INPUTS = 24
+REPEATS = 4          # each input is explained this many times per round
+NUM_THREADS = 16
+ROUNDS = 3
+TOLERANCE = 1e-3     # CAMs are normalised to [0, 1]
+
+
+def check_model(name, module):
+    rng = np.random.default_rng(0)
+    generator = torch.Generator().manual_seed(0)
+    # In the served model's input format (1-channel uint8 with XRAY_GRAYSCALE=1)
+    grayscale = is_grayscale(registry.get(name).model)
+    inputs = list(example_batch(NUM_INPUTS, grayscale, generator))
+
+    # Serial reference: one request per forward pass, one at a time
+    expected = [module.run_batch([(x, True)])[0] for x in inputs]
+
+    def explain_direct(i):
+        return i, module.run_batch([(inputs[i], True)])[0]
+
+    def explain_batched(i):
+        return i, module.batcher.submit((inputs[i], True)).result()
+
+    failures = 0
+    for round_idx in range(ROUNDS):
+        for mode, explain in (("direct", explain_direct), ("batched", explain_batched)):
+            order = rng.permutation(NUM_INPUTS * REPEATS) % NUM_INPUTS
+            start = time.perf_counter()
+
+            with ThreadPoolExecutor(NUM_THREADS) as pool:
+                for i, (probs, pred_idx, cam, _) in pool.map(explain, order):
+                    ref_probs, ref_idx, ref_cam, _ = expected[i]
+                    if (
+                        pred_idx != ref_idx
+                        or not torch.allclose(probs, ref_probs, atol=1e-4)
+                        or not np.allclose(cam, ref_cam, atol=TOLERANCE)
+                    ):
+                        failures += 1
+                        print(f"  ✗ {name} input {i} ({mode}): max CAM diff {np.abs(cam - ref_cam).max():.5f}")
+
+            elapsed = time.perf_counter() - start
+            print(f"{name} round {round_idx + 1} {mode:8s}: {len(order)} explanations in {elapsed:.2f}s")
+
+    return failures
+
+
+if __name__ == "__main__":
+    print("\n" + "="*60)
+    print("GRADCAM CONCURRENCY STRESS TEST")
+    print("="*60)
+
+    failures = check_model("xray", predict) + check_model("ecg", predict_ecg)
+
+    print("="*60)
+    if failures:
+        print(f"✗ {failures} concurrent GradCAM results differed from the serial output")
+        sys.exit(1)
+    print("✓ All concurrent GradCAM results match the serial output")
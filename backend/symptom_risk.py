@@ -0,0 +1,132 @@
+"""
+SYMPTOM RISK SCORING
+Keyword-based risk assessment of free-text symptoms, precompiled once and
+usable on one text or a whole batch (e.g. the Firestore symptom journal)
+
+A text's result depends only on which keyword categories occur in it, so
+the result for every possible set of categories (2^7) is built up front and
+scoring is reduced to finding the categories. Matching stays plain
+substring containment on the lowercased text, like the original
+per-keyword scan: CPython's C substring search is several times faster per
+character than one combined pattern in the re engine (which has to try the
+alternation at every position) or a pure-Python Aho-Corasick automaton.
+
+Deliberately free of torch/model imports so batch jobs can use it cheaply.
+"""
+
+# Symptom keywords by category, in scoring order
+SYMPTOM_KEYWORDS = {
+    "severe": ["severe", "intense", "extreme", "unbearable", "acute"],
+    "respiratory": ["cough", "breath", "breathing", "shortness", "wheez", "dyspnea"],
+    "fever": ["fever", "temperature", "hot", "chills", "sweating"],
+    "pain": ["pain", "chest pain", "ache", "discomfort", "hurt"],
+    "fatigue": ["tired", "fatigue", "weak", "exhausted", "lethargy"],
+    "mucus": ["mucus", "phlegm", "sputum", "discharge"],
+    "emergency": ["blood", "hemoptysis", "confusion", "unconscious", "severe pain"],
+}
+
+# Risk added per matched category
+CATEGORY_WEIGHTS = {
+    "emergency": 0.4,
+    "severe": 0.3,
+    "respiratory": 0.2,
+    "fever": 0.2,
+    "pain": 0.2,
+}
+DEFAULT_WEIGHT = 0.1
+
+
+def build_result(matched):
+    """Risk assessment for the matched categories (in scoring order)"""
+    # Summed in category order so the float total is reproducible
+    risk_score = 0.0
+    for category in matched:
+        risk_score += CATEGORY_WEIGHTS.get(category, DEFAULT_WEIGHT)
+    risk_score = min(risk_score, 1.0)
+
+    if risk_score >= 0.7:
+        risk_category = "High"
+    elif risk_score >= 0.4:
+        risk_category = "Moderate"
+    elif risk_score >= 0.1:
+        risk_category = "Low"
+    else:
+        risk_category = "Minimal"
+
+    return {
+        "risk_category": risk_category,
+        "risk_score": risk_score,
+        "matched_symptoms": list(set(matched)),
+        "additional_concerns": ["Seek immediate medical attention" if risk_score >= 0.7 else "Monitor symptoms closely"]
+    }
+
+
+class SymptomScorer:
+    """Precompiled keyword matcher with single and batch scoring"""
+
+    def __init__(self, keywords=SYMPTOM_KEYWORDS):
+        categories = list(keywords)
+        # (bit, keywords) per category; a keyword containing another one of
+        # the same category can never decide a match, so it is dropped
+        self._categories = [
+            (1 << index, tuple(
+                keyword for keyword in keywords[category]
+                if not any(other != keyword and other in keyword for other in keywords[category])
+            ))
+            for index, category in enumerate(categories)
+        ]
+        # Category bitmask -> result
+        self._results = [
+            build_result([category for index, category in enumerate(categories) if mask >> index & 1])
+            for mask in range(1 << len(categories))
+        ]
+
+    def _result(self, text, mask):
+        if not text:
+            return {
+                "risk_category": "Unknown",
+                "risk_score": 0.0,
+                "matched_symptoms": [],
+                "additional_concerns": []
+            }
+        # Fresh lists per call so callers can mutate results independently
+        result = self._results[mask]
+        return {**result, "matched_symptoms": list(result["matched_symptoms"]),
+                "additional_concerns": list(result["additional_concerns"])}
+
+    def _mask(self, symptom_text):
+        """Bitmask of the categories with a keyword in the text"""
+        mask = 0
+        if symptom_text:
+            text = symptom_text.lower()
+            for bit, words in self._categories:
+                for keyword in words:
+                    if keyword in text:
+                        mask |= bit
+                        break
+        return mask
+
+    def score(self, symptom_text):
+        """Enhanced symptom analysis with risk assessment"""
+        return self._result(symptom_text, self._mask(symptom_text))
+
+    def score_batch(self, texts):
+        """
+        Score many texts at once; repeated texts are matched only once
+
+        Returns:
+            list of results, in the order of `texts` (same as score() on each)
+        """
+        masks = {}
+        results = []
+        for text in texts:
+            mask = masks.get(text)
+            if mask is None:
+                mask = masks[text] = self._mask(text)
+            results.append(self._result(text, mask))
+        return results
+
+
+scorer = SymptomScorer()
+score = scorer.score
+score_batch = scorer.score_batch
@@ -0,0 +1,168 @@
+"""
+CPU THREAD TUNING
+Picks the number of PyTorch intra-op threads per worker process at startup
+
+Every uvicorn worker gets its own intra-op pool, and every concurrently
+running batch uses a full team of those threads, so the default (one thread
+per core, per process) oversubscribes the machine as soon as there is more
+than one worker. The tuner splits the cores between SERVER_WORKERS
+processes, times the loaded model at each candidate thread count with
+BATCH_WORKERS batches in flight (the batcher's real concurrency) and pins
+the count with the best throughput. TORCH_THREADS skips the benchmark.
+
+torch.set_num_threads only sizes the OpenMP team of the thread calling it
+(and of threads created later), so inference threads that were already
+running when tuning finished pick the count up through apply().
+"""
+
+import os
+import threading
+import time
+
+import torch
+
+from grayscale_model import is_grayscale
+from preprocessing import example_batch
+from settings import BATCH_WORKERS, MAX_BATCH_SIZE, SERVER_WORKERS, TORCH_INTEROP_THREADS, TORCH_THREADS
+
+# Forward passes per concurrent batch at each candidate (after one warmup pass)
+ITERATIONS = 8
+
+# A smaller thread count within this fraction of the best throughput wins
+TOLERANCE = 0.05
+
+_status = {"state": "pending", "threads": None, "source": None, "candidates": []}
+_done = threading.Event()
+
+# Thread count last applied on each thread
+_applied = threading.local()
+
+
+def available_cores():
+    """Cores this process may run on (respects taskset / container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def candidate_threads(cores, workers=SERVER_WORKERS):
+    """Powers of two up to this worker's share of the cores, plus the share itself"""
+    share = max(1, cores // max(1, workers))
+    candidates = []
+    threads = 1
+    while threads < share:
+        candidates.append(threads)
+        threads *= 2
+    candidates.append(share)
+    return candidates
+
+
+def benchmark(model, threads, concurrency=BATCH_WORKERS, batch_size=min(4, MAX_BATCH_SIZE), iterations=ITERATIONS):
+    """
+    Throughput (images/s) and p95 batch latency of `model` with `threads`
+    intra-op threads and `concurrency` batches running at once
+    """
+    torch.set_num_threads(threads)
+    batch = example_batch(batch_size, is_grayscale(model))
+    latencies = []
+    lock = threading.Lock()
+
+    def run():
+        with torch.inference_mode():
+            model(batch)  # warmup
+            for _ in range(iterations):
+                start = time.perf_counter()
+                model(batch)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+    workers = [threading.Thread(target=run) for _ in range(max(1, concurrency))]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "threads": threads,
+        "images_per_second": round(len(latencies) * batch_size / elapsed, 2),
+        "p95_batch_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+    }
+
+
+def tune(model, candidates):
+    """Benchmark every candidate and return (best_threads, results)"""
+    results = [benchmark(model, threads) for threads in candidates]
+    best = max(result["images_per_second"] for result in results)
+    for result in results:
+        if result["images_per_second"] >= best * (1 - TOLERANCE):
+            return result["threads"], results
+
+
+def configure(get_model):
+    """
+    Set inter-op threads and pin intra-op threads, tuning if not overridden
+
+    Without a model to benchmark (get_model is None, or loading it fails)
+    the worker's even share of the cores is used.
+
+    Args:
+        get_model: Callable returning the eager model to benchmark (blocks
+                   until it is loaded), or None
+    """
+    try:
+        # Only possible before any inter-op work has started
+        torch.set_num_interop_threads(max(1, TORCH_INTEROP_THREADS))
+    except RuntimeError:
+        pass
+
+    cores = available_cores()
+    candidates = candidate_threads(cores)
+    threads, source, results = candidates[-1], "core share", []
+    try:
+        if TORCH_THREADS > 0:
+            threads, source = TORCH_THREADS, "TORCH_THREADS"
+        elif len(candidates) > 1 and get_model is not None:
+            threads, results = tune(get_model(), candidates)
+            source = "benchmark"
+    except Exception as e:
+        print(f"⚠ Thread tuning failed, using this worker's share of the cores: {e}")
+        source = f"core share (tuning failed: {e})"
+
+    torch.set_num_threads(threads)
+    _status.update(state="done", threads=threads, source=source, candidates=results)
+    _done.set()
+
+    print(f"✓ Using {threads} torch thread(s) per worker ({source}; {cores} cores, {SERVER_WORKERS} worker(s))")
+    for result in results:
+        print(f"  {result['threads']:>3} threads: {result['images_per_second']:>8.1f} img/s, p95 batch {result['p95_batch_ms']:.1f} ms")
+
+
+def apply():
+    """
+    Use the tuned thread count on the calling thread
+
+    Run by the batcher and executor threads before each batch/call; only
+    calls into torch when the count changed since this thread last applied
+    it, and does nothing until tuning is done.
+    """
+    threads = _status["threads"]
+    if threads is not None and getattr(_applied, "threads", None) != threads:
+        torch.set_num_threads(threads)
+        _applied.threads = threads
+
+
+def configure_in_background(get_model):
+    threading.Thread(target=configure, args=(get_model,), name="thread-tuning", daemon=True).start()
+
+
+def is_done():
+    return _done.is_set()
+
+
+def status():
+    return {**_status, "interop_threads": torch.get_num_interop_threads(), "cores": available_cores(), "server_workers": SERVER_WORKERS}
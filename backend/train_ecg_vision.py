@@ -11,6 +11,8 @@ from torch.utils.data import DataLoader
 from torchvision import datasets, transforms, models
 import time
 
+from model_registry import save_checkpoint_atomic
+
 # Configuration
 DATASET_PATH = "ecg_image_data"
 BATCH_SIZE = 32
@@ -120,7 +122,7 @@ def train_ecg_model():
         print(f"Test Acc: {test_acc:.2f}%")
         
     # Save
-    torch.save(model.state_dict(), "ecg_resnet_model.pth")
+    save_checkpoint_atomic(model.state_dict(), "ecg_resnet_model.pth")
     print("\nModel saved as ecg_resnet_model.pth")
 
 if __name__ == "__main__":
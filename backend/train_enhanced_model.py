@@ -14,6 +14,8 @@ from sklearn.metrics import accuracy_score, classification_report, confusion_mat
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from model_registry import save_checkpoint_atomic
+
 # Set device
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"Using device: {device}")
@@ -343,7 +345,7 @@ print(f"{'='*60}")
 
 # Save final model for backend
 final_model_path = "xray_pneumonia_model.pth"
-torch.save(model.state_dict(), final_model_path)
+save_checkpoint_atomic(model.state_dict(), final_model_path)
 print(f"\n✓ Final model saved as: {final_model_path}")
 
 # ============================================================
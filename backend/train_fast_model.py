@@ -12,6 +12,8 @@ from torchvision import datasets, transforms, models
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 import time
 
+from model_registry import save_checkpoint_atomic
+
 # Set device
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"Using device: {device}")
@@ -186,7 +188,7 @@ for epoch in range(NUM_EPOCHS):
     # Save best model
     if test_acc > best_acc:
         best_acc = test_acc
-        torch.save(model.state_dict(), "xray_pneumonia_model.pth")
+        save_checkpoint_atomic(model.state_dict(), "xray_pneumonia_model.pth")
         print(f"✓ Best model saved! (Test Acc: {test_acc:.2f}%)")
 
 training_time = time.time() - start_time
@@ -0,0 +1,156 @@
+"""
+BACKGROUND UPLOADS
+Runs Cloudinary uploads in a worker pool after the AI result has been
+returned, and tracks their status for /uploads/{upload_id}
+"""
+
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from caching import LRUCache
+from metrics import UPLOAD_FAILURES, UPLOAD_SECONDS
+
+# upload ids are uuid4 hex strings (they end up in file paths)
+UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def record_upload(kind, result, seconds):
+    """Upload duration and failure metrics for one upload_fn result"""
+    outcome = "success" if result.get("success") else "failure"
+    UPLOAD_SECONDS.labels(kind, outcome).observe(seconds)
+    if outcome == "failure":
+        UPLOAD_FAILURES.labels(kind).inc()
+
+
+class UploadManager:
+    """
+    Uploads a request's files concurrently in the background
+
+    Each job uploads a set of named files ("file", "heatmap", ...) in
+    parallel. Its status is kept in a bounded table and reports per-file
+    results plus convenience keys such as file_url / heatmap_url once they
+    are known. With a `status_cache` (a PredictionCache) every status change
+    is also written there, so any worker process sharing its directory can
+    answer for jobs started by another one.
+    """
+
+    def __init__(self, upload_fn, max_workers=4, max_jobs=1024, status_cache=None):
+        self.upload_fn = upload_fn
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="upload")
+        self._jobs = LRUCache(max_jobs)
+        self._status_cache = status_cache
+        self._lock = threading.Lock()
+        self._counters = {"jobs": 0, "uploads": 0, "failed_uploads": 0}
+
+    def submit(self, files, on_complete=None):
+        """
+        Start uploading `files` in the background
+
+        Args:
+            files: {name: (data, folder, filename)}, e.g. {"file": ..., "heatmap": ...}
+            on_complete: Optional callback(status) run once every file finished
+
+        Returns:
+            str: upload_id for status()
+        """
+        upload_id = uuid.uuid4().hex
+        job = {
+            "upload_id": upload_id,
+            "status": "pending",
+            "created_at": time.time(),
+            "remaining": len(files),
+            "files": {name: {"status": "pending"} for name in files},
+        }
+        self._jobs.put(upload_id, job)
+        with self._lock:
+            self._counters["jobs"] += 1
+
+        if not files:
+            job["status"] = "complete"
+            self._publish(self._view(job))
+            if on_complete:
+                on_complete(self._view(job))
+            return upload_id
+
+        # Published before any upload can finish and overwrite it
+        self._publish(self._view(job))
+        for name, (data, folder, filename) in files.items():
+            self._pool.submit(self._upload, job, name, data, folder, filename, on_complete)
+        return upload_id
+
+    def _upload(self, job, name, data, folder, filename, on_complete):
+        started = time.perf_counter()
+        try:
+            result = self.upload_fn(data, folder=folder, filename=filename)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        record_upload(name, result, time.perf_counter() - started)
+
+        with self._lock:
+            self._counters["uploads"] += 1
+            if result.get("success"):
+                job["files"][name] = {"status": "done", "url": result["url"], "public_id": result["public_id"]}
+            else:
+                self._counters["failed_uploads"] += 1
+                job["files"][name] = {"status": "failed", "error": result.get("error", "Upload failed")}
+                print(f"Background upload of {filename} failed: {job['files'][name]['error']}")
+
+            job["remaining"] -= 1
+            finished = job["remaining"] == 0
+            if finished:
+                failed = sum(1 for info in job["files"].values() if info["status"] == "failed")
+                if failed == 0:
+                    job["status"] = "complete"
+                elif failed == len(job["files"]):
+                    job["status"] = "failed"
+                else:
+                    job["status"] = "partial"
+            view = self._view(job) if finished else None
+
+        if finished:
+            self._publish(view)
+        if finished and on_complete:
+            try:
+                on_complete(view)
+            except Exception as e:
+                print(f"Upload completion callback failed: {e}")
+
+    @staticmethod
+    def _view(job):
+        view = {
+            "upload_id": job["upload_id"],
+            "status": job["status"],
+            "files": {name: dict(info) for name, info in job["files"].items()},
+        }
+        for name, info in job["files"].items():
+            if info["status"] == "done":
+                view[f"{name}_url"] = info["url"]
+                view["cloudinary_public_id" if name == "file" else f"{name}_public_id"] = info["public_id"]
+        return view
+
+    def _publish(self, view):
+        """Share a job's status with the other workers"""
+        if self._status_cache is None:
+            return
+        try:
+            self._status_cache.put(view["upload_id"], view)
+        except OSError as e:
+            print(f"⚠ Could not store upload status {view['upload_id']}: {e}")
+
+    def status(self, upload_id):
+        """Current status of a job, or None if it is unknown or forgotten"""
+        job = self._jobs.get(upload_id)
+        if job is not None:
+            with self._lock:
+                return self._view(job)
+        # Started by another worker process, which keeps updating it
+        if self._status_cache is not None and UPLOAD_ID.match(upload_id or ""):
+            return self._status_cache.get(upload_id, memory=False)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
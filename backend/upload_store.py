@@ -0,0 +1,180 @@
+"""
+UPLOAD STORE
+Bounded, content-addressed local copies of uploaded scans (ARCHIVE_UPLOADS)
+
+Files are stored as <root>/<sha256[:2]>/<sha256><ext>, so concurrent uploads
+with the same client filename never overwrite each other and re-uploading
+the same scan keeps a single copy. The total size is capped: expired files
+go first, then the least recently stored/used ones. Sweeps re-read the size
+from disk, so the cap holds across worker processes sharing the root. The
+root stays the directory behind the /uploaded_images static mount.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+
+# Leading bytes -> extension, so identical scans dedupe whatever they were named
+MAGIC = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF8", ".gif"),
+    (b"BM", ".bmp"),
+    (b"II*\x00", ".tif"),
+    (b"MM\x00*", ".tif"),
+)
+
+# Longest gap between sweeps for expired files
+SWEEP_SECONDS = 3600
+
+SHARD = re.compile(r"^[0-9a-f]{2}$")
+EXTENSION = re.compile(r"^\.[a-z0-9]{1,5}$")
+
+
+def sniff_extension(data, filename=None):
+    """File extension from the content, else from a sane client filename"""
+    for magic, ext in MAGIC:
+        if data.startswith(magic):
+            return ext
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if EXTENSION.match(ext) else ""
+
+
+class UploadStore:
+    """
+    Sharded, deduplicating file store with a size cap and TTL
+
+    Only the two-hex-digit shard directories are managed, so anything else
+    under the root (e.g. the local Cloudinary stand-in) is left alone.
+    """
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024, ttl_seconds=30 * 24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._counters = {"stores": 0, "dedupes": 0, "evictions": 0}
+        self._last_sweep = time.time()
+
+        os.makedirs(root, exist_ok=True)
+        self._disk_bytes = sum(size for _, size, _ in self._entries())
+
+    # ---- Store / lookup ----
+
+    def put(self, data, filename=None):
+        """
+        Store `data` and return its path relative to the root
+
+        Identical content is written once; storing it again only refreshes
+        its position in the eviction order.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        relative_path = f"{digest[:2]}/{digest}{sniff_extension(data, filename)}"
+        path = self.path(relative_path)
+
+        if self.touch(relative_path):
+            self._count("dedupes")
+            return relative_path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique across threads and processes sharing the directory
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._disk_bytes += len(data) - previous
+            self._counters["stores"] += 1
+            # Static files never pass through here, so expired ones are
+            # also swept periodically rather than only on lookup
+            due = self._disk_bytes > self.max_bytes or time.time() - self._last_sweep >= min(self.ttl_seconds, SWEEP_SECONDS)
+
+        if due:
+            self._evict()
+        return relative_path
+
+    def path(self, relative_path):
+        """Filesystem path of a stored file"""
+        return os.path.join(self.root, *relative_path.split("/"))
+
+    def touch(self, relative_path):
+        """Mark a stored file as used; False if it is gone"""
+        try:
+            os.utime(self.path(relative_path))
+            return True
+        except OSError:
+            return False
+
+    # ---- Disk maintenance ----
+
+    def _entries(self):
+        for shard in os.listdir(self.root):
+            directory = os.path.join(self.root, shard)
+            if not SHARD.match(shard) or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+            self._counters["evictions"] += 1
+
+    def _evict(self):
+        """
+        Resync the size from disk, then drop expired files and least recently
+        used ones until under the cap
+        """
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        with self._lock:
+            # Includes what other workers stored since the last sweep
+            self._disk_bytes = sum(size for _, size, _ in entries)
+            self._last_sweep = now
+        remaining = []
+        for path, size, mtime in entries:
+            if now - mtime >= self.ttl_seconds:
+                self._remove(path)
+            else:
+                remaining.append(path)
+
+        # Leave some headroom so we don't evict on every store
+        target = self.max_bytes * 0.9
+        for path in remaining:
+            if self._disk_bytes <= target:
+                break
+            self._remove(path)
+
+    # ---- Statistics ----
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                "disk_bytes": self._disk_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -352,8 +352,8 @@ export default function DoctorDashboard() {
         riskLevel: result.risk_level,
         symptomRisk: result.symptom_risk
       });
-      const baseUrl = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000';
-      setHeatmap(baseUrl + "/" + result.heatmap_path);
+      // heatmap_url is rendered on demand by the backend, relative to the API
+      setHeatmap(result.heatmap_url ? getApiUrl(result.heatmap_url) : "");
 
     } catch (error: any) {
       console.error("AI Analysis Error:", error);
@@ -574,7 +574,7 @@ export default function DoctorDashboard() {
                               riskLevel: recordData.aiRiskLevel,
                               symptomRisk: recordData.symptomRisk
                             });
-                            setHeatmap(recordData.heatmapUrl || "");
+                            setHeatmap(recordData.heatmapUrl ? getApiUrl(recordData.heatmapUrl) : "");
                             setDoctorNote(recordData.doctorNote || "");
                             setSearchError("");
                             setSearchDocId("");
@@ -631,7 +631,7 @@ export default function DoctorDashboard() {
                         riskLevel: record.aiRiskLevel,
                         symptomRisk: record.symptomRisk
                       });
-                      setHeatmap(record.heatmapUrl || "");
+                      setHeatmap(record.heatmapUrl ? getApiUrl(record.heatmapUrl) : "");
 
                       setDoctorNote(record.doctorNote || "");
                     }}
@@ -10,6 +10,7 @@ import { collection, addDoc, query, where, onSnapshot, deleteDoc, doc, getDoc, o
 import { ref, uploadBytes, getDownloadURL, deleteObject } from 'firebase/storage';
 import { useRouter } from 'next/navigation';
 import { getApiUrl } from '@/lib/config';
+import { patchRecordWhenUploaded } from '@/lib/uploads';
 import { saveSymptomEntry } from "@/lib/firestore/symptoms";
 import { saveVitalsEntry } from "@/lib/firestore/vitals";
 import MyFilesStorage from "@/components/patient/MyFilesStorage";
@@ -475,9 +476,10 @@ export default function PatientDashboard() {
                 throw new Error(errMsg);
             }
 
-            setUploadProgress("Saving results...");
+            // Show the result right away; the scan itself is still being
+            // uploaded to Cloudinary in the background
             const data = await response.json();
-            const cloudinaryURL = data.file_url;
+            const cloudinaryURL = data.file_url || null;
             const heatmapURL = data.heatmap_url || "";
 
             setXrayPrediction({
@@ -487,7 +489,8 @@ export default function PatientDashboard() {
                 fileName: file.name
             });
 
-            await addDoc(collection(db, "medical_records"), {
+            setUploadProgress("Saving results...");
+            const recordRef = await addDoc(collection(db, "medical_records"), {
                 patientId: auth.currentUser.uid,
                 patientName: userProfile?.fullName || "Unknown",
                 patientEmail: auth.currentUser.email || "N/A",
@@ -508,6 +511,11 @@ export default function PatientDashboard() {
                 heatmapUrl: heatmapURL
             });
 
+            // Fill fileUrl in once the background upload is done
+            patchRecordWhenUploaded(data, recordRef).catch((error) => {
+                console.error("Could not attach the uploaded X-ray to the record:", error);
+            });
+
             setFile(null);
             setSymptoms("");
             setUploadProgress("Complete!");
@@ -572,6 +580,7 @@ export default function PatientDashboard() {
                 throw new Error(errMsg);
             }
 
+            // Show the result right away; the upload finishes in the background
             const data = await response.json();
             setEcgPrediction(data);
 
@@ -590,7 +599,7 @@ export default function PatientDashboard() {
                 patientMobile: userProfile?.mobile || "N/A",
                 type: "ECG",
                 fileName: ecgFile.name,
-                fileUrl: data.file_url, // Use Cloudinary URL
+                fileUrl: data.file_url || null, // Cloudinary URL, filled in once uploaded
                 status: "PENDING_REVIEW",
                 doctorReviewed: false, 
                 uploadedAt: new Date().toISOString(),
@@ -609,7 +618,10 @@ export default function PatientDashboard() {
                 recordData.ecgConfidence = data.confidence;
             }
 
-            await addDoc(collection(db, "medical_records"), recordData);
+            const recordRef = await addDoc(collection(db, "medical_records"), recordData);
+            patchRecordWhenUploaded(data, recordRef).catch((error) => {
+                console.error("Could not attach the uploaded ECG to the record:", error);
+            });
 
             // alert("ECG Analysis Successful!");
             toast.success("ECG Analysis Successful!");
@@ -1108,7 +1120,7 @@ export default function PatientDashboard() {
                                                                             />
                                                                             {record.heatmapUrl && (
                                                                                 <div className="absolute inset-0 pointer-events-none">
-                                                                                    <img src={record.heatmapUrl} className="w-full h-full object-contain mix-blend-screen opacity-60" alt="Heatmap" />
+                                                                                    <img src={getApiUrl(record.heatmapUrl)} className="w-full h-full object-contain mix-blend-screen opacity-60" alt="Heatmap" />
                                                                                 </div>
                                                                             )}
                                                                             <div className="absolute bottom-0 left-0 right-0 bg-black/60 text-[8px] text-center text-white py-1 pointer-events-none">Red areas = ROI</div>
@@ -1234,7 +1246,7 @@ export default function PatientDashboard() {
                                                         <div className="bg-black/40 border border-white/10 rounded-xl p-1 overflow-hidden">
                                                             <p className="text-xs text-gray-400 uppercase font-semibold p-3 pl-4">Grad-CAM Activation Map</p>
                                                             <img
-                                                                src={ecgPrediction.heatmap_url}
+                                                                src={getApiUrl(ecgPrediction.heatmap_url)}
                                                                 alt="ECG Heatmap"
                                                                 className="w-full rounded-lg"
                                                             />
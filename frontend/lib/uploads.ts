@@ -0,0 +1,54 @@
+import { updateDoc, DocumentReference } from 'firebase/firestore';
+import { getApiUrl } from '@/lib/config';
+
+/**
+ * Wait for the backend's background Cloudinary uploads of an analysis result
+ * and merge the resulting URLs (file_url, cloudinary_public_id) into it.
+ * @param result - JSON returned by /predict or /predict_ecg
+ * @param timeoutMs - Give up after this long and return the result as-is
+ * @returns The result with its uploaded URLs filled in when available
+ */
+export async function withUploadedUrls(result: any, timeoutMs: number = 60000): Promise<any> {
+    if (!result?.upload_id) return result;
+
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        // A status the server can't answer for yet (e.g. a 404 from another
+        // worker, or a restart) means "still pending", not "no URL"
+        const response = await fetch(getApiUrl(`/uploads/${result.upload_id}`)).catch(() => null);
+        const status = response?.ok ? await response.json() : null;
+        if (status && status.status !== 'pending') {
+            return {
+                ...result,
+                file_url: status.file_url ?? result.file_url,
+                cloudinary_public_id: status.cloudinary_public_id ?? result.cloudinary_public_id,
+            };
+        }
+
+        await new Promise((resolve) => setTimeout(resolve, 500));
+    }
+
+    return result;
+}
+
+/**
+ * Fill the uploaded file URL into an already saved medical record once the
+ * background upload finishes. Meant to run without being awaited, so the
+ * prediction can be shown and saved straight away.
+ * @param result - JSON returned by /predict or /predict_ecg
+ * @param recordRef - The medical_records document saved from that result
+ * @param timeoutMs - Give up after this long, leaving the record unchanged
+ */
+export async function patchRecordWhenUploaded(
+    result: any,
+    recordRef: DocumentReference,
+    timeoutMs: number = 5 * 60000
+): Promise<void> {
+    const uploaded = await withUploadedUrls(result, timeoutMs);
+    if (!uploaded.file_url || uploaded.file_url === result.file_url) return;
+
+    await updateDoc(recordRef, {
+        fileUrl: uploaded.file_url,
+        cloudinaryPublicId: uploaded.cloudinary_public_id || "",
+    });
+}